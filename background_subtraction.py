@@ -1,9 +1,6 @@
-import os
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use Agg backend for non-interactive environments
-import matplotlib.pyplot as plt
+from diagnostics import DiagnosticPlots
 
 def load_background_spectrum(background_file, header_lines=0, footer_lines=0):
     """
@@ -54,19 +51,56 @@ def subtract_background(mean_df, background_data):
     Returns:
     - DataFrame with background-subtracted data.
     """
+    # Subtract from a copy so the measured data is left untouched
+    values = mean_df.to_numpy(dtype=np.float64, copy=True)
+    subtract_background_array(values, mean_df.index.values.astype(float), background_data)
+
+    return pd.DataFrame(values, index=mean_df.index, columns=mean_df.columns, copy=False)
+
+def subtract_background_array(values, wavelengths, background_data, times=None, timepoints_to_plot=[0, 10, 100], output_dir="background_subtraction", diagnostics=None):
+    """
+    Subtract the background absorbance from a wavelengths x time block in place.
+
+    Parameters:
+    - values: 2D float array of measured data, wavelengths x timepoints; modified in place.
+    - wavelengths: The wavelengths corresponding to the rows of values.
+    - background_data: DataFrame containing the background data (wavelength and absorbance).
+    - times: Times in seconds of the columns, used to name the comparison plots.
+    - timepoints_to_plot: List of timepoints (indices) to plot.
+    - output_dir: Directory to save the plots.
+    - diagnostics: Optional DiagnosticPlots collector to queue the comparison plots on (no plots if None).
+
+    Returns:
+    - values: The same array, background-subtracted.
+    """
     # Interpolate the background absorbance values at the wavelengths in the measured data
-    background_interp = np.interp(mean_df.index, background_data['Wavelength'], background_data['Absorbance'])
+    background_interp = np.interp(wavelengths, background_data['Wavelength'], background_data['Absorbance'])
 
-    # Create a copy of the DataFrame to store the subtracted values
-    mean_data_subtracted = mean_df.copy()
+    # Keep the original spectra that will be plotted before they are overwritten
+    originals = {}
+    if diagnostics is not None:
+        originals = {idx: values[:, idx].copy() for idx in timepoints_to_plot if idx < values.shape[1]}
 
-    # Subtract the background absorbance for each timepoint
-    for timepoint in mean_df.columns:
-        mean_data_subtracted[timepoint] = mean_df[timepoint] - background_interp
-    
-    return mean_data_subtracted
+    # Subtract the background absorbance for all timepoints at once
+    values -= background_interp[:, None]
+
+    for idx, original in originals.items():
+        timepoint = f'{times[idx]:g}s' if times is not None else idx
+        _queue_comparison(diagnostics, wavelengths, timepoint, original, values[:, idx], output_dir)
+
+    return values
 
-def plot_comparison(mean_df, mean_data_subtracted, timepoints_to_plot=[0, 10, 100], output_dir="background_subtraction_plots"):
+def _queue_comparison(diagnostics, wavelengths, timepoint, original, subtracted, output_dir):
+    """Queue the plot of one original and background-subtracted spectrum."""
+    diagnostics.add(
+        f"{output_dir}/spectrum_{timepoint}.png",
+        wavelengths,
+        [(original, 'Original Spectrum'),
+         (subtracted, 'Subtracted Spectrum')],
+        title=f'Time {timepoint} - Original and Subtracted Spectra'
+    )
+
+def plot_comparison(mean_df, mean_data_subtracted, timepoints_to_plot=[0, 10, 100], output_dir="background_subtraction_plots", diagnostics=None):
     """
     Function to plot comparison of original and subtracted spectra at specific timepoints.
     The plots will be saved as PNG files in the specified output directory.
@@ -75,37 +109,26 @@ def plot_comparison(mean_df, mean_data_subtracted, timepoints_to_plot=[0, 10, 10
     - mean_data_subtracted: The background-subtracted DataFrame.
     - timepoints_to_plot: List of timepoints (indices) to plot.
     - output_dir: Directory to save the plots.
+    - diagnostics: Optional DiagnosticPlots collector; the plots are queued on it instead of
+      being rendered straight away.
     """
-    # Ensure the output directory exists
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    render_now = diagnostics is None
+    if render_now:
+        diagnostics = DiagnosticPlots()
 
-    # Loop through the specified timepoints and plot the spectra
+    # Loop through the specified timepoints and queue the spectra
     for idx in timepoints_to_plot:
         if idx >= len(mean_df.columns):
             continue  # Skip if the timepoint index is out of range
 
         timepoint = mean_df.columns[idx]
-        plt.figure(figsize=(10, 6))
-        
-        # Plot the original spectrum
-        plt.plot(mean_df.index, mean_df[timepoint].values, label='Original Spectrum')
-        
-        # Plot the subtracted spectrum
-        plt.plot(mean_df.index, mean_data_subtracted[timepoint].values, label='Subtracted Spectrum')
-
-        plt.xlabel('Wavelength')
-        plt.ylabel('Absorbance')
-        plt.title(f'Time {timepoint} - Original and Subtracted Spectra')
-        plt.legend()
+        _queue_comparison(diagnostics, mean_df.index, timepoint, mean_df[timepoint].values,
+                          mean_data_subtracted[timepoint].values, output_dir)
 
-        # Save the plot as a PNG file
-        plot_filename = f"{output_dir}/spectrum_{timepoint}.png"
-        plt.savefig(plot_filename)
-        plt.close()  # Close the plot to avoid displaying it in a non-interactive environment
-        print(f"Plot saved: {plot_filename}")
+    if render_now:
+        diagnostics.render()
 
-def subtract_background_and_save(mean_df, background_file, output_file='averaged_data_subtracted.csv', timepoints_to_plot=[0, 10, 100], output_dir="background_subtraction"):
+def subtract_background_and_save(mean_df, background_file, output_file='averaged_data_subtracted.csv', timepoints_to_plot=[0, 10, 100], output_dir="background_subtraction", diagnostics=None):
     background_data = load_background_spectrum(background_file)
     mean_data_subtracted = subtract_background(mean_df, background_data)
     
@@ -114,6 +137,6 @@ def subtract_background_and_save(mean_df, background_file, output_file='averaged
     print(f"Subtracted data saved to {output_file}")
     
     # Plot comparison for specific timepoints and save the figures
-    plot_comparison(mean_df, mean_data_subtracted, timepoints_to_plot, output_dir)
+    plot_comparison(mean_df, mean_data_subtracted, timepoints_to_plot, output_dir, diagnostics=diagnostics)
     
     return mean_data_subtracted
@@ -1,91 +1,138 @@
 # baseline_correction.py
-import subprocess
-import sys
-import importlib.util
-import os
-
-def install_package(package):
-    """Install a package using pip."""
-    subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-
-def check_and_install():
-    """Check if required libraries are installed, and install them if missing."""
-    required_libraries = ['scipy', 'pybaselines']
-
-    for library in required_libraries:
-        if importlib.util.find_spec(library) is None:
-            print(f"{library} not found. Installing...")
-            install_package(library)
+import numpy as np
+import pandas as pd
+from diagnostics import DiagnosticPlots
+from dataset import SpectralDataset
+
+def imodpoly_batch(data, wavelengths, poly_order=4, tol=1e-3, max_iter=250, num_std=1):
+    """
+    Fit improved modified polynomial (IModPoly) baselines to many spectra at once.
+
+    Follows pybaselines.polynomial.imodpoly (with mask_initial_peaks=True) for every column of data,
+    but works on the whole 2D block: the Vandermonde matrix and its pseudo-inverse are computed once
+    for the shared wavelength axis, each spectrum's peak mask gives a small (poly_order + 1)^2 normal
+    matrix that is inverted once, and the clipping iterations then run for all unconverged spectra together.
+
+    Parameters:
+    - data: 2D array of absorbance data, wavelengths x spectra.
+    - wavelengths: The wavelengths corresponding to the rows of data.
+    - poly_order: The order of the polynomial used for baseline fitting.
+    - tol: Tolerance for the baseline fitting algorithm.
+    - max_iter: Maximum number of clipping iterations.
+    - num_std: Number of standard deviations for the fitting.
+
+    Returns:
+    - baselines: 2D float64 array of fitted baselines, same shape as data.
+    """
+    y = np.array(data, dtype=np.float64)
+    x = np.asarray(wavelengths, dtype=np.float64)
+
+    # Vandermonde on x mapped to [-1, 1] for numerical stability, as pybaselines does
+    mapped_x = np.polynomial.polyutils.mapdomain(x, np.polynomial.polyutils.getdomain(x), np.array([-1., 1.]))
+    vandermonde = np.polynomial.polynomial.polyvander(mapped_x, poly_order)
+
+    # Initial unweighted fit of every spectrum with the shared pseudo-inverse
+    baselines = vandermonde @ (np.linalg.pinv(vandermonde) @ y)
+    deviation = np.std(y - baselines, axis=0)
+
+    # Mask the initial peaks; each spectrum keeps its own weighted pseudo-inverse from here on
+    weights = (baselines + deviation >= y).astype(np.float64)
+    outer = (vandermonde[:, :, None] * vandermonde[:, None, :]).reshape(len(x), -1)
+    normal = (weights.T @ outer).reshape(-1, poly_order + 1, poly_order + 1)
+    normal_pinv = np.linalg.pinv(normal)
+
+    # Iterate on compacted arrays holding only the spectra that have not converged yet
+    active = np.arange(y.shape[1])
+    result = baselines
+    for _ in range(max_iter):
+        y = np.minimum(y, baselines + num_std * deviation)
+        coef = np.einsum('skl,sl->sk', normal_pinv, (weights * y).T @ vandermonde)
+        baselines = vandermonde @ coef.T
+        new_deviation = np.std(y - baselines, axis=0)
+        difference = np.abs(deviation - new_deviation) / np.maximum(np.abs(new_deviation), np.finfo(float).eps)
+
+        converged = difference < tol
+        if converged.any():
+            result[:, active[converged]] = baselines[:, converged]
+            keep = ~converged
+            active, y, baselines, weights, normal_pinv = active[keep], y[:, keep], baselines[:, keep], weights[:, keep], normal_pinv[keep]
+            deviation = new_deviation[keep]
+            if active.size == 0:
+                break
         else:
-            print(f"{library} is already installed.")
+            deviation = new_deviation
 
-# Check and install the required libraries before the rest of the script runs
-check_and_install()
+    # Spectra that reached max_iter keep their last baseline
+    result[:, active] = baselines
+    return result
 
-import numpy as np
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use Agg backend for non-interactive environments
-import matplotlib.pyplot as plt
-from scipy.signal import savgol_filter
-from pybaselines.polynomial import imodpoly
+def baseline_correct_array(values, wavelengths, poly_order=4, tol=1e-3, num_std=1, output_dir="baseline_correction", diagnostics=None):
+    """
+    Subtract IModPoly baselines from a wavelengths x spectra block in place.
 
-def apply_baseline_correction(data, wavelengths, poly_order=4, tol=1e-3, num_std=1, output_dir="baseline_correction"):
+    Parameters:
+    - values: 2D float64 array of absorbance data, wavelengths x spectra; modified in place.
+    - wavelengths: The wavelengths corresponding to the rows of values.
+    - poly_order, tol, num_std: Baseline fitting options (see imodpoly_batch).
+    - output_dir: Directory to save the plots.
+    - diagnostics: Optional DiagnosticPlots collector to queue the plots on (no plots if None).
+
+    Returns:
+    - values: The same array, baseline-subtracted.
+    """
+    baselines = imodpoly_batch(values, wavelengths, poly_order=poly_order, tol=tol, num_std=num_std)
+
+    # Optionally plot the correction for every 100th spectrum
+    if diagnostics is not None:
+        for column_index in range(0, values.shape[1], 100):
+            diagnostics.add(
+                f"{output_dir}/spectrum_{column_index + 1}.png",
+                wavelengths,
+                [(values[:, column_index], 'Original Spectrum'),
+                 (baselines[:, column_index], 'Fitted Baseline'),
+                 (values[:, column_index] - baselines[:, column_index], 'Baseline Subtracted')],
+                title=f'Baseline Subtraction - Spectrum {column_index + 1}'
+            )
+
+    values -= baselines
+    return values
+
+def apply_baseline_correction(data, wavelengths=None, poly_order=4, tol=1e-3, num_std=1, output_dir="baseline_correction", diagnostics=None):
     """
-    Apply baseline correction to each spectrum using imodpoly.
+    Apply IModPoly baseline correction to all spectra at once (see imodpoly_batch).
 
     Parameters:
-    - data: DataFrame or numpy array of absorbance data.
-    - wavelengths: The wavelengths corresponding to the absorbance data.
+    - data: SpectralDataset, or DataFrame of absorbance data.
+    - wavelengths: The wavelengths corresponding to the rows of a DataFrame; its index if not given
+      (a SpectralDataset always uses its own wavelengths).
     - poly_order: The order of the polynomial used for baseline fitting.
     - tol: Tolerance for the baseline fitting algorithm.
     - num_std: Number of standard deviations for the fitting.
     - output_dir: Directory to save the plots.
+    - diagnostics: Optional DiagnosticPlots collector; the plots are queued on it instead of
+      being rendered when the correction is done.
 
     Returns:
-    - baseline_subtracted_data: Data after baseline subtraction.
-    - baseline_corrected_data: The baseline that was fitted.
+    - baseline_subtracted_data: The data after baseline subtraction: a new SpectralDataset for a
+      dataset, or a float64 DataFrame with the same index and columns as the input DataFrame.
     """
-    # Ensure the output directory exists
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    baseline_subtracted_df = pd.DataFrame(index=data.index, columns=data.columns)
-
-    for column_index in range(data.shape[1]):
-        column_to_correct = data.iloc[:, column_index].values
-
-        # Apply baseline correction using imodpoly
-        baseline_corrected, params = imodpoly(
-            column_to_correct,
-            x_data=wavelengths,
-            poly_order=poly_order,
-            tol=tol,
-            num_std=num_std,
-            return_coef=True
-        )
-
-        # Subtract the baseline from the original data
-        baseline_subtracted = column_to_correct - baseline_corrected
-
-        # Save the baseline-subtracted data
-        baseline_subtracted_df.iloc[:, column_index] = baseline_subtracted
-
-        # Optionally plot the correction for every 100th spectrum
-        if column_index % 100 == 0:
-            plt.figure(figsize=(10, 6))
-            plt.plot(wavelengths, column_to_correct, label='Original Spectrum')
-            plt.plot(wavelengths, baseline_corrected, label='Fitted Baseline')
-            plt.plot(wavelengths, baseline_subtracted, label='Baseline Subtracted')
-            plt.xlabel('Wavelength')
-            plt.ylabel('Absorbance')
-            plt.title(f'Baseline Subtraction - Spectrum {column_index + 1}')
-            plt.legend()
-
-            # Save the plot as a PNG file
-            plot_filename = f"{output_dir}/spectrum_{column_index + 1}.png"
-            plt.savefig(plot_filename)
-            plt.close()  # Close the plot to avoid displaying it in a non-interactive environment
-            print(f"Plot saved: {plot_filename}")
-
-    return baseline_subtracted_df
\ No newline at end of file
+    render_now = diagnostics is None
+    if render_now:
+        diagnostics = DiagnosticPlots()
+
+    if isinstance(data, SpectralDataset):
+        baseline_subtracted = data.copy()
+        values, wavelengths = baseline_subtracted.values, baseline_subtracted.wavelengths
+    else:
+        values = data.to_numpy(dtype=np.float64, copy=True)
+        if wavelengths is None:
+            wavelengths = data.index.values.astype(float)
+    baseline_correct_array(values, wavelengths, poly_order=poly_order, tol=tol, num_std=num_std,
+                           output_dir=output_dir, diagnostics=diagnostics)
+    if not isinstance(data, SpectralDataset):
+        baseline_subtracted = pd.DataFrame(values, index=data.index, columns=data.columns, copy=False)
+
+    if render_now:
+        diagnostics.render()
+
+    return baseline_subtracted
\ No newline at end of file
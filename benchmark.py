@@ -0,0 +1,448 @@
+# benchmark.py
+"""
+Timing benchmarks for the processing pipeline, run on synthetic data.
+
+Usage:
+    python benchmark.py parse --rows 600 --cols 5000
+    python benchmark.py baseline --rows 700 --cols 2000
+    python benchmark.py smoothing --rows 700 --cols 10000
+    python benchmark.py startup
+    python benchmark.py fitting --rows 320 --cols 200 --jobs 4
+    python benchmark.py decay --traces 20
+    python benchmark.py kinetics --rows 300 --cols 200
+    python benchmark.py tail --rows 600 --cols 2000 --chunks 20
+    python benchmark.py lookup --rows 2000 --targets 1000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import spec_import
+
+def write_synthetic_asc(file_path, rows, cols, header_lines=2, seed=0):
+    """
+    Write a synthetic time-resolved .asc file with a header and a text footer.
+
+    Parameters:
+    - file_path: Path of the file to write.
+    - rows: Number of wavelength rows.
+    - cols: Number of time columns per row.
+    - header_lines: Number of header lines to write before the data.
+    - seed: Seed for the random absorbance values.
+    """
+    rng = np.random.default_rng(seed)
+    wavelengths = np.linspace(250, 600, rows)
+    absorbance = rng.random((rows, cols))
+    with open(file_path, 'w') as file:
+        for i in range(header_lines):
+            file.write(f"Header line {i + 1}\n")
+        for wavelength, row in zip(wavelengths, absorbance):
+            file.write(f"{wavelength:.3f}\t" + "\t".join(f"{value:.6f}" for value in row) + "\n")
+        file.write("\n\nEnd of data\n")
+
+def best_time(func, repeat):
+    """Return the best wall time of `repeat` calls to func."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench_parse(args):
+    """Compare the per-line float conversion with the bulk parser on a wide file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "synthetic.asc")
+        write_synthetic_asc(file_path, args.rows, args.cols)
+        size_mb = os.path.getsize(file_path) / 1e6
+
+        def per_line():
+            with open(file_path, 'rb') as file:
+                lines = file.read().splitlines()[2:]
+            return spec_import._parse_lines(spec_import._locate_numeric_block(lines))
+
+        def bulk():
+            return spec_import.read_absorbance_array(file_path, header_lines=2)
+
+        assert np.array_equal(per_line(), bulk())
+        t_line = best_time(per_line, args.repeat)
+        t_bulk = best_time(bulk, args.repeat)
+
+    print(f"File: {args.rows} rows x {args.cols} time points ({size_mb:.1f} MB)")
+    print(f"Per-line parse: {t_line:.3f} s")
+    print(f"Bulk parse:     {t_bulk:.3f} s")
+    print(f"Speedup:        {t_line / t_bulk:.1f}x")
+
+def synthetic_spectra(rows, cols, seed=0):
+    """Return wavelengths and a wavelengths x spectra block with two peaks on a curved baseline plus noise."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(250, 600, rows)
+    baseline = 0.1 + 5e-4 * (x - 250)[:, None] * rng.random(cols) + 1e-6 * ((x - 400) ** 2)[:, None]
+    peaks = 0.5 * np.exp(-(x - 412)[:, None] ** 2 / 200) * rng.random(cols) + 0.3 * np.exp(-(x - 330)[:, None] ** 2 / 300)
+    return x, baseline + peaks + 0.01 * rng.standard_normal((rows, cols))
+
+def bench_baseline(args):
+    """Compare per-spectrum pybaselines imodpoly with the batched engine, checking they agree."""
+    from pybaselines.polynomial import imodpoly
+    from baseline_correction import imodpoly_batch
+
+    x, y = synthetic_spectra(args.rows, args.cols)
+
+    def per_column():
+        return np.column_stack([imodpoly(y[:, i], x_data=x, poly_order=4, tol=1e-3, num_std=1)[0]
+                                for i in range(y.shape[1])])
+
+    def batched():
+        return imodpoly_batch(y, x, poly_order=4, tol=1e-3, num_std=1)
+
+    reference, result = per_column(), batched()
+    np.testing.assert_allclose(result, reference, rtol=0, atol=1e-10)
+    max_difference = np.abs(reference - result).max()
+    t_column = best_time(per_column, args.repeat)
+    t_batch = best_time(batched, args.repeat)
+
+    print(f"Spectra: {args.cols} x {args.rows} wavelengths")
+    print(f"Per-column imodpoly: {t_column:.3f} s")
+    print(f"Batched imodpoly:    {t_batch:.3f} s")
+    print(f"Speedup:             {t_column / t_batch:.1f}x (max baseline difference {max_difference:.2e})")
+
+def bench_smoothing(args):
+    """Compare column-wise DataFrame.apply smoothing with the single-call 2D smoothing stage."""
+    import pandas as pd
+    from scipy.signal import savgol_filter
+    from smoothing import smooth_array
+
+    x, y = synthetic_spectra(args.rows, args.cols)
+    data = pd.DataFrame(y, index=x)
+
+    def per_column():
+        return data.apply(lambda column: savgol_filter(column, 11, 2), axis=0).values
+
+    def whole_block():
+        return smooth_array(data.values, 11, 2)
+
+    max_difference = np.abs(per_column() - whole_block()).max()
+    t_column = best_time(per_column, args.repeat)
+    t_block = best_time(whole_block, args.repeat)
+
+    print(f"Spectra: {args.cols} x {args.rows} wavelengths")
+    print(f"DataFrame.apply smoothing: {t_column:.3f} s")
+    print(f"2D smoothing:              {t_block:.3f} s")
+    print(f"Speedup:                   {t_column / t_block:.1f}x (max difference {max_difference:.2e})")
+
+def bench_startup(args):
+    """Time spec_main.py start-up for -h and for a minimal ingest-only run (no optional stages or plots)."""
+    spec_main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec_main.py")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "synthetic.asc")
+        write_synthetic_asc(file_path, args.rows, args.cols)
+        output_dir = os.path.join(tmp_dir, "output")
+
+        def run(*arguments):
+            subprocess.run([sys.executable, spec_main, *arguments], check=True, cwd=tmp_dir,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        t_help = best_time(lambda: run('-h'), args.repeat)
+        t_ingest = best_time(lambda: run('-i', file_path, '-H', '2', '-st', '0', '-o', output_dir), args.repeat)
+
+    print(f"spec_main.py -h:          {t_help:.3f} s")
+    print(f"spec_main.py ingest only: {t_ingest:.3f} s ({args.rows} x {args.cols} file)")
+
+def check_batch_chunking(data, model_spec):
+    """Check that the batched engine's results do not depend on the chunking, with one degenerate spectrum."""
+    import pandas as pd
+    from peak_fitting import fit_time_series
+
+    degenerate = data.iloc[:, :24].copy()
+    degenerate.iloc[:, 9] = 0.0  # No peaks: singular J^T J, so NaN stderr for this spectrum only
+    first = fit_time_series(degenerate, model_spec, jobs=1, engine='batch', chunk_size=5)
+    second = fit_time_series(degenerate, model_spec, jobs=1, engine='batch', chunk_size=7)
+    pd.testing.assert_frame_equal(first, second)
+    stderr = [column for column in first.columns if column.endswith('_stderr')]
+    assert first.iloc[9][stderr].isna().all()
+
+class _InterruptingWriter:
+    """Stand-in for fit_results.FitResultsWriter that interrupts the run at the given write."""
+
+    report = False
+
+    def __init__(self, writes):
+        self.writes = writes
+
+    def write(self, rows):
+        self.writes -= 1
+        if self.writes == 0:
+            raise KeyboardInterrupt
+
+    def write_report(self, reports):
+        pass
+
+def check_checkpoint_resume(data, model_spec):
+    """Check that a batched run interrupted and resumed with another chunk size gives the uninterrupted result."""
+    import pandas as pd
+    from peak_fitting import fit_time_series
+
+    data = data.iloc[:, :24]
+    expected = fit_time_series(data, model_spec, jobs=1, engine='batch', chunk_size=5)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        checkpoint = os.path.join(tmp_dir, 'fit.checkpoint.json')
+        try:
+            fit_time_series(data, model_spec, jobs=1, engine='batch', chunk_size=5,
+                            writer=_InterruptingWriter(3), checkpoint=checkpoint, checkpoint_interval=0)
+        except KeyboardInterrupt:
+            pass
+        assert os.path.exists(checkpoint)
+        resumed = fit_time_series(data, model_spec, jobs=1, engine='batch', chunk_size=7,
+                                  checkpoint=checkpoint, checkpoint_interval=0)
+        assert not os.path.exists(checkpoint)
+    pd.testing.assert_frame_equal(resumed, expected)
+
+def bench_fitting(args):
+    """Compare sequential, process-pool, analytic-Jacobian and batched per-time-point peak fitting."""
+    import pandas as pd
+    from peak_fitting import fit_time_series
+    from spec_analysis import PEAK_MODEL
+
+    x, y = synthetic_spectra(args.rows, args.cols)
+    keep = x >= 280
+    data = pd.DataFrame(y[keep], index=x[keep], columns=np.arange(args.cols) * 0.1)
+    check_batch_chunking(data, PEAK_MODEL)
+    check_checkpoint_resume(data, PEAK_MODEL)
+
+    start = time.perf_counter()
+    sequential = fit_time_series(data, PEAK_MODEL, jobs=1)
+    t_sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    parallel = fit_time_series(data, PEAK_MODEL, jobs=args.jobs)
+    t_parallel = time.perf_counter() - start
+    start = time.perf_counter()
+    analytic = fit_time_series(data, PEAK_MODEL, jobs=1, engine='analytic')
+    t_analytic = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = fit_time_series(data, PEAK_MODEL, jobs=1, engine='batch')
+    t_batch = time.perf_counter() - start
+
+    max_difference = np.nanmax(np.abs(sequential.to_numpy(dtype=float) - parallel.to_numpy(dtype=float)))
+    chisqr_ratio = analytic['chisqr'].sum() / sequential['chisqr'].sum()
+    batch_ratio = batch['chisqr'].sum() / sequential['chisqr'].sum()
+    print(f"Spectra: {args.cols} x {keep.sum()} wavelengths")
+    print(f"Sequential fits:       {t_sequential:.3f} s")
+    print(f"Parallel fits ({args.jobs} jobs): {t_parallel:.3f} s")
+    print(f"Speedup:               {t_sequential / t_parallel:.1f}x (max parameter difference {max_difference:.2e})")
+    print(f"Analytic engine:       {t_analytic:.3f} s")
+    print(f"Speedup:               {t_sequential / t_analytic:.1f}x (chi-square ratio to lmfit {chisqr_ratio:.4f})")
+    print(f"Batched engine:        {t_batch:.3f} s")
+    print(f"Speedup:               {t_sequential / t_batch:.1f}x (chi-square ratio to lmfit {batch_ratio:.4f})")
+
+def bench_decay(args):
+    """Compare a curve_fit per candidate window with the cumulative-sum window search of decay_fit."""
+    import warnings
+    from scipy.ndimage import gaussian_filter1d
+    from scipy.optimize import curve_fit
+    from change_point import detect_onset_burn
+    from decay_fit import decay_windows, exponential_decay, fit_decay
+
+    rng = np.random.default_rng(0)
+    times = np.round(np.arange(101) * 0.1, 1)
+    traces = []
+    for _ in range(args.traces):
+        dose = rng.uniform(0.05, 2) * times
+        onset_dose = dose[int(rng.integers(5, 30))]
+        trace = 0.3 + 0.5 * np.exp(-rng.uniform(0.5, 20) * np.clip(dose - onset_dose, 0, None))
+        trace = gaussian_filter1d(trace + rng.normal(0, 0.01, len(times)), sigma=1)
+        onset_idx, burn_start_idx = detect_onset_burn(trace)
+        traces.append((dose - dose[onset_idx], trace, onset_idx, burn_start_idx))
+
+    def per_window():
+        results = []
+        for dose, trace, onset_idx, burn_start_idx in traces:
+            best_r2 = -np.inf
+            for start, end in decay_windows(onset_idx, burn_start_idx, 0.1):
+                x, y = dose[start:end], trace[start:end]
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        popt, _ = curve_fit(exponential_decay, x, y, p0=[y.max(), y.min(), 2.0 / (x[-1] - x[0])],
+                                            bounds=([0, 0, 0], [np.inf, np.inf, np.inf]), maxfev=20000)
+                except (RuntimeError, ValueError):
+                    continue
+                r2 = 1 - np.sum((y - exponential_decay(x, *popt)) ** 2) / np.sum((y - y.mean()) ** 2)
+                best_r2 = max(best_r2, r2)
+            results.append(best_r2)
+        return np.array(results)
+
+    def window_search():
+        return np.array([fit_decay(*trace, 0.1)['r2'] for trace in traces])
+
+    start = time.perf_counter()
+    r2_window = per_window()
+    t_window = time.perf_counter() - start
+    start = time.perf_counter()
+    r2_search = window_search()
+    t_search = time.perf_counter() - start
+
+    print(f"Traces: {args.traces} x {len(times)} time points")
+    print(f"curve_fit per window: {t_window:.3f} s")
+    print(f"Window search:        {t_search:.3f} s")
+    print(f"Speedup:              {t_window / t_search:.1f}x (max R² shortfall {np.max(r2_window - r2_search):.2e})")
+
+def bench_kinetics(args):
+    """Compare an lmfit exponential fit per wavelength with the batched kinetics map."""
+    import pandas as pd
+    from lmfit.models import ConstantModel, ExponentialModel
+    from kinetics import kinetics_map
+
+    rng = np.random.default_rng(0)
+    times = np.round(np.arange(args.cols) * 0.1, 1)
+    rates = rng.uniform(0.2, 3, args.rows)
+    amplitudes = rng.uniform(-0.5, 1, args.rows)
+    traces = amplitudes[:, None] * np.exp(-np.outer(rates, times)) + 0.2
+    data = pd.DataFrame(traces + rng.normal(0, 0.005, traces.shape), index=np.linspace(250, 600, args.rows),
+                        columns=times)
+
+    def per_wavelength():
+        model = ExponentialModel(prefix='exp_') + ConstantModel(prefix='c_')
+        chisqr = []
+        for trace in data.to_numpy():
+            params = model.make_params(exp_amplitude=trace[0] - trace[-1], exp_decay=1.0, c_c=trace[-1])
+            chisqr.append(model.fit(trace, params, x=times).chisqr)
+        return np.array(chisqr)
+
+    start = time.perf_counter()
+    chisqr_lmfit = per_wavelength()
+    t_lmfit = time.perf_counter() - start
+    start = time.perf_counter()
+    kinetics = kinetics_map(data)
+    t_batch = time.perf_counter() - start
+
+    print(f"Traces: {args.rows} wavelengths x {args.cols} time points")
+    print(f"lmfit per wavelength: {t_lmfit:.3f} s")
+    print(f"Kinetics map:         {t_batch:.3f} s")
+    print(f"Speedup:              {t_lmfit / t_batch:.1f}x (max chi-square ratio to lmfit "
+          f"{np.max(kinetics['chisqr'].to_numpy() / chisqr_lmfit):.4f})")
+
+def bench_tail(args):
+    """Compare re-reading a growing file on every poll with the incremental tail reader."""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.asc')
+        growing = os.path.join(tmp, 'growing.asc')
+        write_synthetic_asc(source, args.rows, args.cols)
+        with open(source, 'rb') as file:
+            raw = file.read()
+        cuts = np.linspace(0, len(raw), args.chunks + 1).astype(int)[1:]
+
+        def poll(read):
+            # Write the file in chunks (cut mid-line) and read after each one
+            open(growing, 'wb').close()
+            start = time.perf_counter()
+            previous = 0
+            for cut in cuts:
+                with open(growing, 'ab') as file:
+                    file.write(raw[previous:cut])
+                previous = cut
+                read()
+            return time.perf_counter() - start
+
+        def reread():
+            # Only complete lines, as a file being written may end in a partial one
+            with open(growing, 'rb') as file:
+                data = file.read()
+            lines = data[:data.rfind(b'\n') + 1].splitlines()[2:]
+            return spec_import.parse_numeric_block(lines)
+
+        t_reread = poll(reread)
+        reader = spec_import.IncrementalReader(growing, header_lines=2)
+        chunks = []
+        t_tail = poll(lambda: chunks.append(reader.read()))
+        chunks.append(reader.read(final=True))
+        tailed = np.vstack([chunk for chunk in chunks if chunk.size])
+        np.testing.assert_array_equal(tailed, spec_import.read_absorbance_array(source, header_lines=2))
+
+    print(f"File: {args.rows} rows x {args.cols} time points, {len(raw) / 1e6:.1f} MB read in {args.chunks} polls")
+    print(f"Re-read per poll:   {t_reread:.3f} s")
+    print(f"Incremental reader: {t_tail:.3f} s ({reader.rows} rows)")
+    print(f"Speedup:            {t_reread / t_tail:.1f}x")
+
+def bench_lookup(args):
+    """Compare the linear nearest-wavelength scans of the scripts with WavelengthIndex lookups."""
+    from wavelength_index import WavelengthIndex
+
+    rng = np.random.default_rng(0)
+    wavelengths = np.round(np.linspace(250, 600, args.rows), 3)
+    targets = rng.uniform(250, 600, args.targets)
+
+    def scan():
+        return np.array([wavelengths[np.abs(wavelengths - target).argmin()] for target in targets])
+
+    def index():
+        return WavelengthIndex(wavelengths).nearest_wavelength(targets)
+
+    t_scan = best_time(scan, args.repeat)
+    t_index = best_time(index, args.repeat)
+    assert np.array_equal(scan(), index())
+
+    print(f"Wavelengths: {args.rows}, targets: {args.targets}")
+    print(f"Linear scan per target: {t_scan * 1000:.2f} ms")
+    print(f"WavelengthIndex:        {t_index * 1000:.2f} ms")
+    print(f"Speedup:                {t_scan / t_index:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="py_spec timing benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    parse_parser = subparsers.add_parser('parse', help="Per-line vs bulk parsing of a wide .asc file")
+    parse_parser.add_argument('--rows', type=int, default=600)
+    parse_parser.add_argument('--cols', type=int, default=5000)
+    parse_parser.add_argument('--repeat', type=int, default=3)
+    parse_parser.set_defaults(func=bench_parse)
+
+    baseline_parser = subparsers.add_parser('baseline', help="Per-column vs batched IModPoly baselines")
+    baseline_parser.add_argument('--rows', type=int, default=700)
+    baseline_parser.add_argument('--cols', type=int, default=2000)
+    baseline_parser.add_argument('--repeat', type=int, default=1)
+    baseline_parser.set_defaults(func=bench_baseline)
+
+    smoothing_parser = subparsers.add_parser('smoothing', help="DataFrame.apply vs 2D Savitzky-Golay smoothing")
+    smoothing_parser.add_argument('--rows', type=int, default=700)
+    smoothing_parser.add_argument('--cols', type=int, default=10000)
+    smoothing_parser.add_argument('--repeat', type=int, default=3)
+    smoothing_parser.set_defaults(func=bench_smoothing)
+
+    startup_parser = subparsers.add_parser('startup', help="Start-up time of spec_main.py")
+    startup_parser.add_argument('--rows', type=int, default=100)
+    startup_parser.add_argument('--cols', type=int, default=100)
+    startup_parser.add_argument('--repeat', type=int, default=5)
+    startup_parser.set_defaults(func=bench_startup)
+
+    fitting_parser = subparsers.add_parser('fitting', help="Sequential vs process-pool peak fitting")
+    fitting_parser.add_argument('--rows', type=int, default=320)
+    fitting_parser.add_argument('--cols', type=int, default=200)
+    fitting_parser.add_argument('--jobs', type=int, default=0)
+    fitting_parser.set_defaults(func=bench_fitting)
+
+    decay_parser = subparsers.add_parser('decay', help="curve_fit per window vs decay window search")
+    decay_parser.add_argument('--traces', type=int, default=20)
+    decay_parser.set_defaults(func=bench_decay)
+
+    kinetics_parser = subparsers.add_parser('kinetics', help="lmfit per wavelength vs batched kinetics map")
+    kinetics_parser.add_argument('--rows', type=int, default=300)
+    kinetics_parser.add_argument('--cols', type=int, default=200)
+    kinetics_parser.set_defaults(func=bench_kinetics)
+
+    tail_parser = subparsers.add_parser('tail', help="Re-reading vs incremental reading of a growing file")
+    tail_parser.add_argument('--rows', type=int, default=600)
+    tail_parser.add_argument('--cols', type=int, default=2000)
+    tail_parser.add_argument('--chunks', type=int, default=20)
+    tail_parser.set_defaults(func=bench_tail)
+
+    lookup_parser = subparsers.add_parser('lookup', help="Linear scan vs binary-search wavelength lookup")
+    lookup_parser.add_argument('--rows', type=int, default=2000)
+    lookup_parser.add_argument('--targets', type=int, default=1000)
+    lookup_parser.add_argument('--repeat', type=int, default=5)
+    lookup_parser.set_defaults(func=bench_lookup)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,134 @@
+# change_point.py
+import numpy as np
+import pandas as pd
+from scipy.ndimage import gaussian_filter1d
+from dataset import as_dataset
+
+def run_lengths(mask):
+    """
+    Length of the run of consecutive True values ending at each position (0 where mask is False).
+
+    This is a per-position run-length encoding of the mask along its last axis, computed with
+    array operations, so a run of at least n exceedances ends wherever run_lengths(mask) >= n.
+
+    Parameters:
+    - mask: Boolean array; runs are counted along the last axis.
+
+    Returns:
+    - lengths: Integer array with the shape of mask.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    positions = np.arange(mask.shape[-1])
+    last_false = np.maximum.accumulate(np.where(mask, -1, positions), axis=-1)
+    return positions - last_false
+
+def counts_since_reset(events, resets):
+    """
+    Number of events since the last reset (inclusive) at each position, along the last axis.
+
+    Parameters:
+    - events: Boolean array of positions that increase the count.
+    - resets: Boolean array of positions that set the count back to zero (must not overlap events).
+
+    Returns:
+    - counts: Integer array with the shape of events.
+    """
+    total = np.cumsum(events, axis=-1)
+    at_reset = np.maximum.accumulate(np.where(resets, total, 0), axis=-1)
+    return total - at_reset
+
+def _first_true(mask):
+    """Index of the first True value along the last axis and whether there is one."""
+    return mask.argmax(axis=-1), mask.any(axis=-1)
+
+def detect_onset_burn(traces, deriv_sigma=2, n_std=3, onset_points=2, burn_points=3,
+                      min_decay_points=5, max_onset_fraction=0.5):
+    """
+    Find the onset of the steep decay and the start of the crystal burn in one or many time traces.
+
+    The derivative of each trace is smoothed, and its mean and spread over the first points
+    (at most 20, a third of the trace) give the thresholds. The onset is where the derivative first
+    stays more than n_std spreads below the baseline for onset_points consecutive points (index of
+    the point where the run is confirmed minus onset_points). The burn is where, from
+    min_decay_points after the onset, the derivative has exceeded n_std spreads above the baseline
+    (and zero) burn_points times without dropping below zero in between (confirming point minus
+    burn_points - 1). The onset is limited to the first max_onset_fraction of the trace and the burn
+    placed at least min_decay_points after the onset.
+
+    Parameters:
+    - traces: 1D trace, or 2D array with one trace per row (e.g. every wavelength), time along the last axis.
+    - deriv_sigma: Sigma of the Gaussian filter applied to the derivative.
+    - n_std: Threshold distance from the baseline derivative, in standard deviations.
+    - onset_points: Consecutive steep points needed for the onset.
+    - burn_points: Rising points needed for the burn.
+    - min_decay_points: Minimum number of points between onset and burn.
+    - max_onset_fraction: Latest onset, as a fraction of the trace length.
+
+    Returns:
+    - onset_idx, burn_start_idx: Indices into the traces (ints for a 1D trace, arrays for 2D);
+      burn_start_idx is the trace length when no burn is found.
+    """
+    traces = np.asarray(traces, dtype=np.float64)
+    single = traces.ndim == 1
+    traces = np.atleast_2d(traces)
+    n_traces, n_points = traces.shape
+
+    onset = np.zeros(n_traces, dtype=np.intp)
+    burn = np.full(n_traces, n_points, dtype=np.intp)
+
+    if n_points > 5:
+        deriv = gaussian_filter1d(np.diff(traces, axis=1), sigma=deriv_sigma, axis=1)
+        n_deriv = deriv.shape[1]
+        baseline_points = min(20, n_deriv // 3)
+        baseline = deriv[:, :baseline_points].mean(axis=1)
+        spread = deriv[:, :baseline_points].std(axis=1)
+
+        # Onset: first run of onset_points steep points after the baseline section
+        steep = deriv[:, baseline_points:] < (baseline - n_std * spread)[:, None]
+        confirmed, found = _first_true(run_lengths(steep) >= onset_points)
+        onset = np.where(found, np.maximum(0, confirmed + baseline_points - onset_points), 0)
+
+        # Burn: rising points counted from min_decay_points after the onset, reset by falling points
+        in_window = np.arange(n_deriv) >= (onset + min_decay_points)[:, None]
+        rising = in_window & (deriv > (baseline + n_std * spread)[:, None]) & (deriv > 0)
+        falling = in_window & (deriv < 0)
+        confirmed, found = _first_true(counts_since_reset(rising, falling) >= burn_points)
+        found &= onset < n_deriv - min_decay_points
+        burn = np.where(found, confirmed - (burn_points - 1), burn)
+
+    onset = np.minimum(onset, int(n_points * max_onset_fraction))
+    burn = np.maximum(burn, onset + min_decay_points)
+
+    if single:
+        return int(onset[0]), int(burn[0])
+    return onset, burn
+
+def onset_burn_map(data, max_time=10.0, trace_sigma=1, **kwargs):
+    """
+    Onset and burn detection for every wavelength of a dataset at once.
+
+    Each wavelength's time trace is smoothed (Gaussian, trace_sigma), cut to max_time and passed
+    to detect_onset_burn, as generate_2x2_plot.py does for the 412 nm trace.
+
+    Parameters:
+    - data: SpectralDataset, or DataFrame with wavelengths as index and numeric times (seconds) as
+      columns, e.g. from spec_io.read_spectra.
+    - max_time: Last time point (seconds) to include.
+    - trace_sigma: Sigma of the Gaussian filter applied to the traces.
+    - kwargs: Passed to detect_onset_burn.
+
+    Returns:
+    - onset_burn: DataFrame indexed by wavelength with onset_idx, burn_start_idx, onset_time and
+      burn_time (the last time point when no burn is found).
+    """
+    dataset = as_dataset(data)
+    times = dataset.window(time_range=(None, max_time)).times
+    traces = gaussian_filter1d(dataset.values, sigma=trace_sigma, axis=1)[:, :len(times)]
+
+    onset, burn = detect_onset_burn(traces, **kwargs)
+    return pd.DataFrame({
+        'onset_idx': onset,
+        'burn_start_idx': burn,
+        'onset_time': times[np.minimum(onset, len(times) - 1)],
+        'burn_time': times[np.minimum(burn, len(times) - 1)],
+    }, index=pd.Index(dataset.wavelengths, name='Wavelength'))
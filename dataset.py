@@ -0,0 +1,144 @@
+# dataset.py
+import numpy as np
+import pandas as pd
+from spec_io import parse_time_labels, read_spectra, time_window, write_spectra
+from wavelength_index import WavelengthIndex
+
+def _axis_window(axis, bounds):
+    """Slice of an ascending axis covering [low, high] (either bound may be None), by binary search."""
+    return slice(None) if bounds is None else time_window(axis, *bounds)
+
+class SpectralDataset:
+    """
+    A block of spectra as one float64 array with its wavelength and time axes and beam metadata.
+
+    values holds one row per wavelength and one column per time point. Both axes are float64 and
+    kept in ascending order (wavelengths in nm, times in seconds), so any wavelength or time range
+    is a contiguous block found by binary search and window() returns views that share memory
+    with the dataset. Transmission (%) and dose rate (MGy/s) travel with the data. Stages can work
+    on the raw arrays directly; DataFrames are only built on request (to_frame), without copying.
+    """
+
+    __slots__ = ('values', 'wavelengths', 'times', 'transmission', 'dose_rate', '_index')
+
+    def __init__(self, values, wavelengths, times, transmission=None, dose_rate=None):
+        """
+        Parameters:
+        - values: 2D array of absorbance data, wavelengths x time points (used directly if it is
+          already a C-contiguous float64 array and both axes are in ascending order).
+        - wavelengths: The wavelengths corresponding to the rows of values.
+        - times: Times in seconds of the columns of values (time labels such as '0.1s' are converted).
+        - transmission: Optional beam transmission in percent.
+        - dose_rate: Optional dose rate in MGy/s.
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        times = parse_time_labels(times)
+        if values.shape != (len(wavelengths), len(times)):
+            raise ValueError(f"values has shape {values.shape}, expected ({len(wavelengths)}, {len(times)}) "
+                             f"for the wavelength and time axes")
+
+        # Sort the axes once here (this copies the data only when they are out of order)
+        if np.any(np.diff(wavelengths) < 0):
+            order = np.argsort(wavelengths, kind='stable')
+            wavelengths, values = wavelengths[order], values[order]
+        if np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind='stable')
+            times, values = times[order], np.ascontiguousarray(values[:, order])
+
+        self._set(values, wavelengths, times, transmission, dose_rate)
+
+    def _set(self, values, wavelengths, times, transmission, dose_rate):
+        self.values = values
+        self.wavelengths = wavelengths
+        self.times = times
+        self.transmission = transmission
+        self.dose_rate = dose_rate
+        self._index = None
+
+    def _view(self, values, wavelengths, times):
+        """Dataset with the same metadata on already sorted arrays (no checks, no copies)."""
+        view = SpectralDataset.__new__(SpectralDataset)
+        view._set(values, wavelengths, times, self.transmission, self.dose_rate)
+        return view
+
+    @classmethod
+    def from_frame(cls, df, transmission=None, dose_rate=None):
+        """
+        Create a dataset from a DataFrame with wavelengths as index and times as columns.
+
+        The data is not copied for a float64 DataFrame with ascending axes (e.g. from read_spectra).
+        """
+        return cls(df.to_numpy(dtype=np.float64), df.index.values, df.columns, transmission, dose_rate)
+
+    @classmethod
+    def read(cls, file_path, transmission=None, dose_rate=None):
+        """Read a dataset written by spec_main in any format of spec_io.read_spectra."""
+        return cls.from_frame(read_spectra(file_path), transmission, dose_rate)
+
+    def to_frame(self):
+        """Return the data as a DataFrame with 'Wavelength' as index and times as columns, sharing memory with the dataset."""
+        index = pd.Index(self.wavelengths, name='Wavelength')
+        return pd.DataFrame(self.values, index=index, columns=pd.Index(self.times), copy=False)
+
+    def write(self, file_path, fmt=None):
+        """Write the data in one of spec_io.FORMATS (inferred from the extension if fmt is not given)."""
+        write_spectra(file_path, self.values, self.wavelengths, self.times, fmt=fmt)
+
+    @property
+    def shape(self):
+        """Number of wavelengths and time points."""
+        return self.values.shape
+
+    @property
+    def index(self):
+        """WavelengthIndex of the wavelength axis, built on first use."""
+        if self._index is None:
+            self._index = WavelengthIndex(self.wavelengths)
+        return self._index
+
+    @property
+    def dose(self):
+        """Accumulated dose (MGy) at every time point, from the dose rate."""
+        if self.dose_rate is None:
+            raise ValueError("The dataset has no dose rate")
+        return self.dose_rate * self.times
+
+    def window(self, wavelength_range=None, time_range=None):
+        """
+        Part of the dataset within a wavelength and time range, as a view (no data is copied).
+
+        Parameters:
+        - wavelength_range: Optional (min, max) wavelengths (nm), inclusive; either may be None.
+        - time_range: Optional (start, end) times (seconds), inclusive; either may be None.
+
+        Returns:
+        - dataset: SpectralDataset sharing memory with this one.
+        """
+        rows = _axis_window(self.wavelengths, wavelength_range)
+        columns = _axis_window(self.times, time_range)
+        return self._view(self.values[rows, columns], self.wavelengths[rows], self.times[columns])
+
+    def traces(self, wavelengths):
+        """
+        Time traces at the recorded wavelengths nearest to the given ones.
+
+        Parameters:
+        - wavelengths: Wavelength or array of wavelengths (nm).
+
+        Returns:
+        - traces: 1D view of the row for a single wavelength, or a 2D array with one row per wavelength.
+        """
+        return self.values[self.index.nearest(wavelengths)]
+
+    def copy(self):
+        """Independent copy of the data, with the same axes and metadata."""
+        return self._view(self.values.copy(), self.wavelengths.copy(), self.times.copy())
+
+    def __repr__(self):
+        return (f"SpectralDataset({len(self.wavelengths)} wavelengths x {len(self.times)} times, "
+                f"transmission={self.transmission}, dose_rate={self.dose_rate})")
+
+def as_dataset(data):
+    """Return data as a SpectralDataset: datasets are passed through, DataFrames are converted without copying."""
+    return data if isinstance(data, SpectralDataset) else SpectralDataset.from_frame(data)
@@ -0,0 +1,175 @@
+# decay_fit.py
+import numpy as np
+from scipy.optimize import curve_fit
+
+def exponential_decay(dose, y_max, y_min, k):
+    """Exponential decay model: y = y_min + (y_max - y_min) * exp(-k * dose)."""
+    return y_min + (y_max - y_min) * np.exp(-k * dose)
+
+def decay_windows(onset_idx, burn_start_idx, time_step):
+    """
+    Candidate fitting windows between the onset and the crystal burn, as in generate_2x2_plot.py.
+
+    Windows start 0.3 s to at most 1.5 s (or half the decay region) after the onset in 0.2 s steps,
+    and cover 70%, 80%, 90% or 100% of the remaining points up to the burn, with at least 5 points.
+
+    Parameters:
+    - onset_idx: Index of the decay onset.
+    - burn_start_idx: Index where the crystal burn starts.
+    - time_step: Time between points (seconds).
+
+    Returns:
+    - windows: List of (start, end) index pairs, end exclusive, in search order.
+    """
+    windows = []
+    decay_region_length = burn_start_idx - onset_idx
+    if decay_region_length < 5:
+        return windows
+
+    max_start_offset = min(1.5, decay_region_length * time_step * 0.5)
+    for start_offset in np.arange(0.3, max_start_offset + 0.1, 0.2):
+        decay_start_idx = onset_idx + int(start_offset / time_step)
+        if decay_start_idx >= burn_start_idx - 5:
+            break
+        for end_fraction in [0.7, 0.8, 0.9, 1.0]:
+            remaining_points = burn_start_idx - decay_start_idx
+            decay_end_idx = min(decay_start_idx + int(remaining_points * end_fraction), burn_start_idx)
+            if decay_end_idx - decay_start_idx >= 5:
+                windows.append((decay_start_idx, decay_end_idx))
+    return windows
+
+def score_windows(dose, trace, windows, k_grid):
+    """
+    R² of the best exponential decay in every window for every decay rate of a grid, without iterating.
+
+    For a fixed k the model is linear in y_min and (y_max - y_min), with basis functions 1 and
+    u = exp(-k * dose). The sums over a window needed for that linear least-squares problem
+    (of 1, u, u², y, u·y and y²) are differences of cumulative sums, so all windows and all k are
+    scored together. Solutions with y_min < 0 are re-solved with y_min = 0 (the fit's lower bound).
+
+    Parameters:
+    - dose: 1D array of doses (from the onset).
+    - trace: 1D array of absorbance values.
+    - windows: List of (start, end) index pairs.
+    - k_grid: 1D array of decay rates to try.
+
+    Returns:
+    - r2: Array (n_windows, n_k) of R² values (-inf where a window cannot be fitted).
+    - y_max, y_min: Arrays (n_windows, n_k) of the linear parameters.
+    """
+    starts = np.array([start for start, _ in windows], dtype=np.intp)
+    ends = np.minimum(np.array([end for _, end in windows], dtype=np.intp), len(trace))
+
+    # Only the points from the first window on are summed. The basis is taken relative to the dose at
+    # that point, u = exp(-k * (dose - dose_0)), so it stays <= 1 and the sums do not overflow; this
+    # only rescales the amplitude. The trace is centred to keep the sums well conditioned, and the
+    # sums run from the end of the trace so that the decaying u terms of later windows are not lost
+    # against the larger terms before them.
+    first = starts.min()
+    starts, ends = starts - first, ends - first
+    dose_0 = dose[first]
+    dose = np.asarray(dose[first:], dtype=np.float64) - dose_0
+    offset = np.mean(trace[first:])
+    y = np.asarray(trace[first:], dtype=np.float64) - offset
+
+    u = np.exp(-np.outer(k_grid, dose))
+
+    def window_sums(values):
+        # Sum over [start, end) of every window from suffix sums: S[start] - S[end]
+        suffix = np.cumsum(values[..., ::-1], axis=-1)[..., ::-1]
+        suffix = np.concatenate([suffix, np.zeros(suffix.shape[:-1] + (1,))], axis=-1)
+        return (suffix[..., starts] - suffix[..., ends]).T
+
+    count = (ends - starts)[:, None].astype(np.float64)
+    s_u, s_uu, s_uy = window_sums(u), window_sums(u * u), window_sums(u * y)
+    s_y = window_sums(y)[:, None]
+    s_yy = window_sums(y * y)[:, None]
+
+    # Least squares for y - offset = a + b * u: normal equations [[n, Su], [Su, Suu]] [a, b] = [Sy, Suy]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        det = count * s_uu - s_u ** 2
+        a = (s_uu * s_y - s_u * s_uy) / det
+        b = (count * s_uy - s_u * s_y) / det
+        ss_res = s_yy - a * s_y - b * s_uy
+
+        # Lower bound y_min >= 0, i.e. a + offset >= 0: fix the intercept at zero absorbance
+        clipped = a + offset < 0
+        fixed_a = -offset
+        fixed_b = (s_uy - fixed_a * s_u) / s_uu
+        fixed_res = (s_yy - 2 * fixed_a * s_y - 2 * fixed_b * s_uy + fixed_a ** 2 * count
+                     + 2 * fixed_a * fixed_b * s_u + fixed_b ** 2 * s_uu)
+        a = np.where(clipped, fixed_a, a)
+        b = np.where(clipped, fixed_b, b)
+        ss_res = np.where(clipped, fixed_res, ss_res)
+
+        ss_tot = s_yy - s_y ** 2 / count
+        r2 = 1 - ss_res / ss_tot
+    valid = (count >= 3) & (ss_tot > 0) & np.isfinite(r2) & (det > 0)
+    r2 = np.where(valid, r2, -np.inf)
+    with np.errstate(over='ignore', invalid='ignore'):
+        y_max = a + offset + b * np.exp(k_grid * dose_0)
+    return r2, y_max, a + offset
+
+def fit_decay(dose, trace, onset_idx, burn_start_idx, time_step, n_k=400):
+    """
+    Find the best fitting window for the exponential decay and fit it.
+
+    All candidate windows (decay_windows) are scored on a logarithmic grid of decay rates with
+    score_windows; only the window with the highest R² is then fitted with nonlinear least squares
+    (curve_fit, bounds y_max, y_min, k >= 0), starting from the grid solution.
+
+    Parameters:
+    - dose: 1D array of doses from the onset (MGy).
+    - trace: 1D array of (smoothed) absorbance values.
+    - onset_idx: Index of the decay onset.
+    - burn_start_idx: Index where the crystal burn starts.
+    - time_step: Time between points (seconds).
+    - n_k: Number of decay rates in the grid.
+
+    Returns:
+    - decay_params: Dict with y_max, y_min, k (MGy^-1), D_half, decay_span, r2 and fit_window,
+      or None if no window can be fitted.
+    """
+    dose = np.asarray(dose, dtype=np.float64)
+    trace = np.asarray(trace, dtype=np.float64)
+    windows = decay_windows(onset_idx, burn_start_idx, time_step)
+    windows = [window for window in dict.fromkeys(windows) if min(window[1], len(trace)) - window[0] >= 3]
+    if not windows:
+        return None
+
+    # Decay rates from well below one e-fold over the longest window to many e-folds over the shortest
+    spans = [dose[min(end, len(dose)) - 1] - dose[start] for start, end in windows]
+    spans = [span for span in spans if span > 0]
+    if not spans:
+        return None
+    k_grid = np.logspace(np.log10(0.01 / max(spans)), np.log10(100 / min(spans)), n_k)
+
+    r2, y_max, y_min = score_windows(dose, trace, windows, k_grid)
+    if not np.isfinite(r2).any():
+        return None
+    best_window, best_k = np.unravel_index(np.argmax(r2), r2.shape)
+    start, end = windows[best_window]
+    decay_dose, decay_abs = dose[start:end], trace[start:end]
+
+    start_max = y_max[best_window, best_k] if np.isfinite(y_max[best_window, best_k]) else np.max(decay_abs)
+    p0 = [max(start_max, 0.0), max(y_min[best_window, best_k], 0.0), k_grid[best_k]]
+    try:
+        popt, _ = curve_fit(exponential_decay, decay_dose, decay_abs, p0=p0,
+                            bounds=([0, 0, 0], [np.inf, np.inf, np.inf]), maxfev=20000)
+    except (RuntimeError, ValueError):
+        popt = np.array(p0)
+
+    residuals = decay_abs - exponential_decay(decay_dose, *popt)
+    ss_res = np.sum(residuals ** 2)
+    ss_tot = np.sum((decay_abs - np.mean(decay_abs)) ** 2)
+    best_r2 = 1 - (ss_res / ss_tot) if ss_tot > 0 else -np.inf
+
+    return {
+        'y_max': popt[0],
+        'y_min': popt[1],
+        'k': popt[2],  # Dose-dependent decay rate constant (MGy^-1)
+        'D_half': np.log(2) / popt[2] if popt[2] > 0 else np.inf,  # Dose at half-maximal decay
+        'decay_span': popt[0] - popt[1],
+        'r2': best_r2,
+        'fit_window': (start, end),
+    }
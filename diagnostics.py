@@ -0,0 +1,88 @@
+# diagnostics.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+def _render_plot(plot):
+    """
+    Render one collected diagnostic plot to a PNG file.
+
+    Defined at module level so it can run in a worker process; matplotlib is only imported here.
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # Use Agg backend for non-interactive environments
+    import matplotlib.pyplot as plt
+
+    output_dir = os.path.dirname(plot['filename'])
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    plt.figure(figsize=(10, 6))
+    for y, label in plot['lines']:
+        plt.plot(plot['x'], y, label=label)
+    plt.xlabel(plot['xlabel'])
+    plt.ylabel(plot['ylabel'])
+    plt.title(plot['title'])
+    plt.legend()
+    plt.savefig(plot['filename'])
+    plt.close()  # Close the plot to avoid displaying it in a non-interactive environment
+    return plot['filename']
+
+class DiagnosticPlots:
+    """
+    Collects the arrays for diagnostic plots while the data is processed and renders them afterwards.
+
+    Processing stages call add() instead of drawing with matplotlib, so the numerical work is not held
+    up by PNG rendering; render() then draws everything, optionally in a process pool. A disabled
+    collector (e.g. for --no-plots) ignores add() and render() entirely.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.plots = []
+
+    def add(self, filename, x, lines, title, xlabel='Wavelength', ylabel='Absorbance'):
+        """
+        Queue a line plot.
+
+        Parameters:
+        - filename: Path of the PNG file to write.
+        - x: Values for the x-axis.
+        - lines: List of (y, label) pairs to plot against x.
+        - title: Plot title.
+        - xlabel, ylabel: Axis labels.
+        """
+        if not self.enabled:
+            return
+        # Copy the arrays, stages may keep modifying their buffers after this call
+        self.plots.append({
+            'filename': filename,
+            'x': np.array(x),
+            'lines': [(np.array(y), label) for y, label in lines],
+            'title': title,
+            'xlabel': xlabel,
+            'ylabel': ylabel,
+        })
+
+    def render(self, jobs=1):
+        """
+        Render all queued plots and clear the queue.
+
+        Parameters:
+        - jobs: Number of worker processes; 0 uses all cores, 1 renders in this process.
+        """
+        plots, self.plots = self.plots, []
+        if not self.enabled or not plots:
+            return
+
+        if jobs == 0:
+            jobs = os.cpu_count() or 1
+
+        if jobs > 1 and len(plots) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(plots))) as executor:
+                filenames = list(executor.map(_render_plot, plots))
+        else:
+            filenames = [_render_plot(plot) for plot in plots]
+
+        for filename in filenames:
+            print(f"Plot saved: {filename}")
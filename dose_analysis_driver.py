@@ -0,0 +1,293 @@
+# dose_analysis_driver.py
+"""
+Dose analysis of a set of transmission datasets, one worker process per dataset.
+
+Usage:
+    python dose_analysis_driver.py DTNB_Dose -o spectral_analysis_output -j 4
+    python dose_analysis_driver.py DTNB_Dose -o spectral_analysis_output --global-fit 350 450
+
+Reads every final_pyspec_<transmission>.csv (or .npz/.parquet) in the directory, computes the dose
+axis, onset/burn points and the exponential decay fit of the 412 nm trace for each, and writes a
+summary table and the 2x2 dose-decay figure. --global-fit also fits decay constants shared by all
+datasets and the wavelengths of a range (global_fit.py).
+"""
+import argparse
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Beam and sample parameters for the dose calculation
+BEAM_PARAMETERS = {
+    'flux_ph_per_s': 5.0e12,
+    'energy_keV': 12.4,
+    'beam_diameter_um': 50.0,
+    'crystal_diameter_um': 15.0,
+    'crystal_thickness_um': 5.0,
+    'overlap_fraction': 0.65,
+    'mass_atten_coeff_cm2_g': 0.18,
+    'sample_density_kg_m3': 1350
+}
+
+def full_beam_dose_rate(beam_parameters=BEAM_PARAMETERS):
+    """
+    Dose rate of the unattenuated beam.
+
+    Parameters:
+    - beam_parameters: Dict of beam and sample parameters, see BEAM_PARAMETERS.
+
+    Returns:
+    - dose_rate: Dose rate in Gy/s at 100% transmission.
+    """
+    energy_J = beam_parameters['energy_keV'] * 1000 * 1.60218e-19
+    beam_area_um2 = np.pi * (beam_parameters['beam_diameter_um'] / 2) ** 2
+    effective_beam_area_um2 = beam_area_um2 * beam_parameters['overlap_fraction']
+    irradiated_volume_um3 = effective_beam_area_um2 * beam_parameters['crystal_thickness_um']
+    volume_m3 = irradiated_volume_um3 * 1e-18
+    mass_kg = beam_parameters['sample_density_kg_m3'] * volume_m3
+
+    sample_density_g_cm3 = beam_parameters['sample_density_kg_m3'] / 1000
+    linear_atten_coeff_cm = beam_parameters['mass_atten_coeff_cm2_g'] * sample_density_g_cm3
+    linear_atten_coeff_um = linear_atten_coeff_cm / 10000
+    mu_times_t = linear_atten_coeff_um * beam_parameters['crystal_thickness_um']
+    absorption_fraction = 1 - np.exp(-mu_times_t)
+
+    energy_absorbed_per_s = beam_parameters['flux_ph_per_s'] * energy_J * absorption_fraction
+    return energy_absorbed_per_s / mass_kg if mass_kg > 0 else np.nan
+
+def find_datasets(directory, sample=None, pattern='final_pyspec_*'):
+    """
+    Find the transmission datasets in a directory.
+
+    Parameters:
+    - directory: Directory containing final_pyspec_<transmission>.csv/.npz/.parquet files.
+    - sample: Sample name for the dataset names (default: the directory name up to the first '_',
+      e.g. 'DTNB' for 'DTNB_Dose').
+    - pattern: Glob pattern of the files.
+
+    Returns:
+    - datasets: Dict of dataset name (e.g. 'DTNB_100%') -> (file path, transmission in percent),
+      highest transmission first.
+    """
+    if sample is None:
+        sample = os.path.basename(os.path.normpath(directory)).split('_')[0]
+    datasets = []
+    for file_path in glob.glob(os.path.join(directory, pattern)):
+        match = re.search(r'_(\d+(?:\.\d+)?)\.(?:csv|npz|parquet)$', file_path)
+        if match:
+            datasets.append((float(match.group(1)), file_path))
+    return {f'{sample}_{transmission:g}%': (file_path, transmission)
+            for transmission, file_path in sorted(datasets, reverse=True)}
+
+def analyze_dataset(file_path, transmission_pct, dose_rate_full_beam_Gy_s, max_time=10.0, onset_burn_maps=False):
+    """
+    Dose analysis of one dataset, as in generate_2x2_plot.py.
+
+    The 412 and 315 nm traces are smoothed and cut to max_time, the onset and burn are detected on
+    the 412 nm trace (change_point) and the exponential decay between them is fitted (decay_fit).
+    Defined at module level so it can run in a worker process.
+
+    Parameters:
+    - file_path: Processed spectra file (any format read by spec_io.read_spectra).
+    - transmission_pct: Beam transmission in percent.
+    - dose_rate_full_beam_Gy_s: Dose rate at 100% transmission (Gy/s).
+    - max_time: Last time point (seconds) to analyse.
+    - onset_burn_maps: Also run the onset/burn detection for every wavelength.
+
+    Returns:
+    - result: Dict in the dose_analysis format of generate_2x2_plot.py (times_10s, dose_at_time_MGy,
+      dose_from_onset_MGy, times_from_onset, onset_idx, onset_time, onset_dose, burn_start_idx,
+      trace_412_s, trace_315_s, transmission_pct, dose_rate_MGy_s, decay_params), plus the
+      decay_k_MGy_inv, decay_r2 and decay_start_MGy keys read by dose_decay_2x2_plot and, if
+      requested, the onset_burn_map DataFrame.
+    """
+    from scipy.ndimage import gaussian_filter1d
+    from dataset import SpectralDataset
+    from change_point import detect_onset_burn, onset_burn_map
+    from decay_fit import fit_decay
+
+    transmission_fraction = transmission_pct / 100.0
+    dose_rate_Gy_s = dose_rate_full_beam_Gy_s * transmission_fraction
+    dose_rate_MGy_s = dose_rate_Gy_s * 1e-6
+    dataset = SpectralDataset.read(file_path, transmission=transmission_pct, dose_rate=dose_rate_MGy_s)
+
+    # Time points up to max_time
+    times_10s = dataset.window(time_range=(None, max_time)).times
+
+    # Smoothed 412 nm and 315 nm traces (closest recorded wavelengths)
+    trace_412, trace_315 = dataset.traces([412, 315])
+    trace_412_s = gaussian_filter1d(trace_412, sigma=1)[:len(times_10s)]
+    trace_315_s = gaussian_filter1d(trace_315, sigma=1)[:len(times_10s)]
+
+    # Dose
+    dose_at_time_MGy = dose_rate_Gy_s * times_10s * 1e-6
+
+    # Onset of the steep decay and start of the crystal burn
+    onset_idx, burn_start_idx = detect_onset_burn(trace_412_s)
+    onset_time = times_10s[onset_idx]
+    onset_dose = dose_at_time_MGy[onset_idx]
+    dose_from_onset = dose_at_time_MGy - onset_dose
+    times_from_onset = times_10s - onset_time
+
+    # Best window and exponential decay fit between onset and burn
+    time_step = times_10s[1] - times_10s[0] if len(times_10s) > 1 else 0.1
+    decay_params = fit_decay(dose_from_onset, trace_412_s, onset_idx, burn_start_idx, time_step)
+
+    result = {
+        'times_10s': times_10s,
+        'dose_at_time_MGy': dose_at_time_MGy,
+        'dose_from_onset_MGy': dose_from_onset,
+        'times_from_onset': times_from_onset,
+        'onset_idx': onset_idx,
+        'onset_time': onset_time,
+        'onset_dose': onset_dose,
+        'burn_start_idx': burn_start_idx,
+        'trace_412_s': trace_412_s,
+        'trace_315_s': trace_315_s,
+        'transmission_pct': transmission_pct,
+        'dose_rate_MGy_s': dose_rate_MGy_s,
+        'decay_params': decay_params,
+        'decay_k_MGy_inv': decay_params['k'] if decay_params else np.nan,
+        'decay_r2': decay_params['r2'] if decay_params else np.nan,
+        'decay_start_MGy': dose_at_time_MGy[decay_params['fit_window'][0]] if decay_params else np.nan,
+    }
+    if onset_burn_maps:
+        result['onset_burn_map'] = onset_burn_map(dataset, max_time=max_time)
+    return result
+
+def summary_row(dataset_name, result):
+    """One row of the summary table for a dataset's dose analysis result."""
+    times = result['times_10s']
+    burn_idx = result['burn_start_idx']
+    decay_params = result['decay_params'] or {}
+    fit_window = decay_params.get('fit_window', (np.nan, np.nan))
+    return {
+        'dataset': dataset_name,
+        'transmission_pct': result['transmission_pct'],
+        'dose_rate_MGy_s': result['dose_rate_MGy_s'],
+        'onset_time': result['onset_time'],
+        'onset_dose_MGy': result['onset_dose'],
+        'burn_time': times[burn_idx] if burn_idx < len(times) else times[-1],
+        'k_MGy_inv': decay_params.get('k', np.nan),
+        'D_half_MGy': decay_params.get('D_half', np.nan),
+        'y_max': decay_params.get('y_max', np.nan),
+        'y_min': decay_params.get('y_min', np.nan),
+        'decay_span': decay_params.get('decay_span', np.nan),
+        'r2': decay_params.get('r2', np.nan),
+        'fit_start_idx': fit_window[0],
+        'fit_end_idx': fit_window[1],
+    }
+
+def run_dose_analysis(directory, sample=None, beam_parameters=BEAM_PARAMETERS, jobs=0, max_time=10.0,
+                      onset_burn_maps=False, pattern='final_pyspec_*'):
+    """
+    Run the dose analysis for every transmission dataset in a directory, in parallel.
+
+    Parameters:
+    - directory: Directory containing final_pyspec_<transmission> files (see find_datasets).
+    - sample: Sample name used for the dataset names (see find_datasets).
+    - beam_parameters: Beam and sample parameters for the dose rate.
+    - jobs: Number of worker processes; 0 uses all cores, 1 processes in this process.
+    - max_time: Last time point (seconds) to analyse.
+    - onset_burn_maps: Also compute the onset/burn map over all wavelengths of each dataset.
+    - pattern: Glob pattern of the dataset files.
+
+    Returns:
+    - dose_analysis: Dict of dataset name -> analyze_dataset result, highest transmission first,
+      as consumed by dose_decay_2x2_plot.create_dose_decay_2x2.
+    - summary: DataFrame with one row per dataset (onset, burn and decay fit results).
+    """
+    datasets = find_datasets(directory, sample, pattern)
+    dose_rate = full_beam_dose_rate(beam_parameters)
+    names = list(datasets)
+    tasks = [(file_path, transmission, dose_rate, max_time, onset_burn_maps)
+             for file_path, transmission in datasets.values()]
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            results = list(executor.map(analyze_dataset, *zip(*tasks)))
+    else:
+        results = [analyze_dataset(*task) for task in tasks]
+
+    dose_analysis = dict(zip(names, results))
+    summary = pd.DataFrame([summary_row(name, result) for name, result in dose_analysis.items()])
+    if not summary.empty:
+        summary = summary.set_index('dataset')
+    return dose_analysis, summary
+
+def run_global_fit(directory, dose_analysis, sample=None, wavelength_range=None, n_components=1, max_time=10.0,
+                   pattern='final_pyspec_*'):
+    """
+    Global decay fit (global_fit.global_decay_fit) over the datasets of a dose analysis.
+
+    Each dataset is fitted from its onset to the start of its burn (or max_time) on its own dose
+    axis, with the decay constants shared by all datasets and wavelengths.
+
+    Parameters:
+    - directory, sample, pattern: As for run_dose_analysis.
+    - dose_analysis: The dose_analysis dict returned by run_dose_analysis for the same directory.
+    - wavelength_range: Optional (min, max) wavelengths (nm) to fit; all wavelengths if not given.
+    - n_components: Number of shared exponential components.
+    - max_time: Last time point (seconds) to fit.
+
+    Returns:
+    - result: The global_decay_fit result dict.
+    """
+    from dataset import SpectralDataset
+    from global_fit import global_decay_fit
+
+    datasets = {}
+    for name, (file_path, transmission) in find_datasets(directory, sample, pattern).items():
+        result = dose_analysis[name]
+        dataset = SpectralDataset.read(file_path, transmission=transmission, dose_rate=result['dose_rate_MGy_s'])
+        times, burn_idx = result['times_10s'], result['burn_start_idx']
+        datasets[name] = {
+            'data': dataset.window(wavelength_range, (None, max_time)),
+            'start_time': result['onset_time'],
+            'end_time': times[burn_idx] if burn_idx < len(times) else None,
+        }
+    return global_decay_fit(datasets, n_components=n_components)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dose analysis of a directory of transmission datasets")
+    parser.add_argument('directory', help="Directory with final_pyspec_<transmission>.csv files")
+    parser.add_argument('-o', '--output', default='.', help="Output directory")
+    parser.add_argument('-s', '--sample', default=None, help="Sample name (default: from the directory name)")
+    parser.add_argument('-j', '--jobs', type=int, default=0, help="Worker processes (0 = all cores)")
+    parser.add_argument('-t', '--max-time', type=float, default=10.0, help="Last time point to analyse (s)")
+    parser.add_argument('--maps', action='store_true', help="Also write onset/burn maps over all wavelengths")
+    parser.add_argument('--global-fit', nargs=2, type=float, metavar=('MIN', 'MAX'), default=None,
+                        help="Also fit decay constants shared by all datasets over this wavelength range (nm)")
+    parser.add_argument('--components', type=int, default=1, help="Exponential components of the global fit")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    dose_analysis, summary = run_dose_analysis(args.directory, sample=args.sample, jobs=args.jobs,
+                                               max_time=args.max_time, onset_burn_maps=args.maps)
+    print(summary.to_string())
+    summary.to_csv(os.path.join(args.output, 'dose_analysis_summary.csv'))
+
+    if args.maps:
+        for name, result in dose_analysis.items():
+            result['onset_burn_map'].to_csv(os.path.join(args.output, f"onset_burn_map_{name.replace('%', 'pct')}.csv"))
+
+    if args.global_fit is not None:
+        result = run_global_fit(args.directory, dose_analysis, sample=args.sample, wavelength_range=args.global_fit,
+                                n_components=args.components, max_time=args.max_time)
+        rates = pd.DataFrame({'k_MGy_inv': result['rates'], 'k_stderr': result['rates_stderr'],
+                              'D_half_MGy': result['half_doses']},
+                             index=pd.RangeIndex(1, args.components + 1, name='component'))
+        print(rates.to_string())
+        rates.to_csv(os.path.join(args.output, 'global_fit_rates.csv'))
+        result['traces'].to_csv(os.path.join(args.output, 'global_fit_traces.csv'))
+
+    from dose_decay_2x2_plot import create_dose_decay_2x2
+    create_dose_decay_2x2(dose_analysis, os.path.join(args.output, 'dose_decay_2x2.png'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# fit_results.py
+import csv
+import os
+import numpy as np
+
+# Table formats supported by FitResultsWriter (parquet needs pyarrow)
+FORMATS = ('csv', 'parquet')
+
+def model_result_row(out, **labels):
+    """
+    Flatten an lmfit ModelResult into one row of a results table.
+
+    Parameters:
+    - out: The lmfit ModelResult.
+    - labels: Leading columns identifying the fit, e.g. wavelength=412.0.
+
+    Returns:
+    - row: Dict with the labels, the value and stderr of every parameter, and chisqr, redchi,
+      success and nfev.
+    """
+    row = dict(labels)
+    for name, param in out.params.items():
+        row[name] = param.value
+        row[f'{name}_stderr'] = param.stderr if param.stderr is not None else np.nan
+    row.update({'chisqr': out.chisqr, 'redchi': out.redchi, 'success': out.success, 'nfev': out.nfev})
+    return row
+
+class FitResultsWriter:
+    """
+    Streams fit results into a columnar table, one row per fit, through a single open file handle.
+
+    The columns are taken from the first row written. CSV rows are written as they arrive; Parquet
+    rows are buffered and written as row groups of batch_size rows. The human-readable text reports
+    are only written when a report_path is given. Use as a context manager, or call close().
+    """
+
+    def __init__(self, file_path, fmt=None, report_path=None, batch_size=1000):
+        """
+        Parameters:
+        - file_path: Path of the results table.
+        - fmt: 'csv' or 'parquet'; inferred from the file extension if not given.
+        - report_path: Optional path of a text file for the verbose fit reports.
+        - batch_size: Number of rows per Parquet row group.
+        """
+        if fmt is None:
+            fmt = os.path.splitext(file_path)[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown results format '{fmt}', expected one of {FORMATS}")
+
+        self.file_path = file_path
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.columns = None
+        self._buffer = []
+        self._parquet_writer = None
+        self._file = open(file_path, 'w', newline='') if fmt == 'csv' else None
+        self._csv_writer = csv.writer(self._file) if fmt == 'csv' else None
+        self._report = open(report_path, 'w') if report_path is not None else None
+
+    @property
+    def report(self):
+        """True if text reports are being written."""
+        return self._report is not None
+
+    def write(self, rows):
+        """
+        Append result rows to the table.
+
+        Parameters:
+        - rows: List of dicts, all with the same keys.
+        """
+        if not rows:
+            return
+        if self.columns is None:
+            self.columns = list(rows[0])
+            if self._csv_writer is not None:
+                self._csv_writer.writerow(self.columns)
+
+        if self._csv_writer is not None:
+            self._csv_writer.writerows([row[column] for column in self.columns] for row in rows)
+        else:
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._write_row_group()
+
+    def write_report(self, texts):
+        """Append text fit reports, if reports are enabled."""
+        if self._report is not None:
+            self._report.writelines(texts)
+
+    def _write_row_group(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {column: [row[column] for row in self._buffer] for column in self.columns}
+        schema = self._parquet_writer.schema if self._parquet_writer is not None else None
+        table = pa.table(columns, schema=schema)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.file_path, table.schema)
+        self._parquet_writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        """Flush any buffered rows and close the files."""
+        if self._buffer:
+            self._write_row_group()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        for handle in (self._file, self._report):
+            if handle is not None:
+                handle.close()
+        self._file = self._report = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,315 @@
+# gaussian_model.py
+import numpy as np
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+# fwhm = FWHM_FACTOR * sigma, as in lmfit's GaussianModel
+FWHM_FACTOR = 2 * np.sqrt(2 * np.log(2))
+TINY = 1.0e-15
+
+class GaussianBaselineModel:
+    """
+    Sum of Gaussian peaks on a linear baseline with analytic derivatives.
+
+    Uses the same line shapes and parameter names as lmfit's GaussianModel and LinearModel with
+    prefixes (peak1_amplitude, peak1_center, peak1_sigma, base_slope, base_intercept, ...):
+    gaussian = amplitude / (sigma * sqrt(2*pi)) * exp(-(x - center)**2 / (2 * sigma**2)) and
+    linear = slope * x + intercept. All components are evaluated in one NumPy pass, and the
+    parameter vectors may carry leading batch dimensions, e.g. (n_spectra, n_params).
+    """
+
+    def __init__(self, components):
+        """
+        Parameters:
+        - components: List of (kind, prefix) pairs, kind being 'gaussian' or 'linear',
+          e.g. [('gaussian', 'peak1_'), ('linear', 'base_')].
+        """
+        self.components = list(components)
+        self.param_names = []
+        peaks, lines = [], []
+        for kind, prefix in self.components:
+            start = len(self.param_names)
+            if kind == 'gaussian':
+                self.param_names += [f'{prefix}amplitude', f'{prefix}center', f'{prefix}sigma']
+                peaks.append([start, start + 1, start + 2])
+            elif kind == 'linear':
+                self.param_names += [f'{prefix}slope', f'{prefix}intercept']
+                lines.append([start, start + 1])
+            else:
+                raise ValueError(f"Unsupported component '{kind}', expected 'gaussian' or 'linear'")
+        self._peaks = np.array(peaks, dtype=np.intp).reshape(-1, 3)
+        self._lines = np.array(lines, dtype=np.intp).reshape(-1, 2)
+
+    @classmethod
+    def from_model_spec(cls, model_spec):
+        """Build the model for a peak_fitting model specification (gaussian and linear components only)."""
+        return cls([(component['model'], component['prefix']) for component in model_spec])
+
+    def initial_params(self, model_spec):
+        """
+        Starting values and bounds from a peak_fitting model specification.
+
+        Bounds not given in the specification default to lmfit's: sigma >= 0, everything else unbounded.
+        Starting values are clipped into their bounds, as lmfit does.
+
+        Returns:
+        - values, lower, upper: 1D arrays ordered like param_names.
+        """
+        values = np.zeros(len(self.param_names))
+        lower = np.full(len(self.param_names), -np.inf)
+        upper = np.full(len(self.param_names), np.inf)
+        lower[self._peaks[:, 2]] = 0.0
+
+        position = {name: i for i, name in enumerate(self.param_names)}
+        for component in model_spec:
+            for name, hint in component.get('params', {}).items():
+                i = position[component['prefix'] + name]
+                if not isinstance(hint, dict):
+                    hint = {'value': hint}
+                values[i] = hint.get('value', values[i])
+                lower[i] = hint.get('min', lower[i])
+                upper[i] = hint.get('max', upper[i])
+        return np.clip(values, lower, upper), lower, upper
+
+    def _peak_terms(self, params, x):
+        amplitude = params[..., self._peaks[:, 0], None]
+        center = params[..., self._peaks[:, 1], None]
+        sigma = np.maximum(params[..., self._peaks[:, 2], None], TINY)
+        offset = x - center
+        shape = np.exp(-offset ** 2 / (2 * sigma ** 2)) / (sigma * SQRT_2PI)
+        return amplitude, sigma, offset, shape
+
+    def eval(self, params, x):
+        """
+        Evaluate the model.
+
+        Parameters:
+        - params: Array of parameters ordered like param_names, shape (..., n_params).
+        - x: 1D array of wavelengths.
+
+        Returns:
+        - y: Model values, shape (..., len(x)).
+        """
+        params = np.asarray(params, dtype=np.float64)
+        amplitude, _, _, shape = self._peak_terms(params, x)
+        y = (amplitude * shape).sum(axis=-2)
+        for slope, intercept in self._lines:
+            y += params[..., slope, None] * x + params[..., intercept, None]
+        return y
+
+    def jacobian(self, params, x):
+        """
+        Analytic derivatives of the model with respect to the parameters.
+
+        Returns:
+        - jac: Array of shape (..., len(x), n_params).
+        """
+        params = np.asarray(params, dtype=np.float64)
+        amplitude, sigma, offset, shape = self._peak_terms(params, x)
+        peak = amplitude * shape
+
+        jac = np.zeros(params.shape[:-1] + (len(x), len(self.param_names)))
+        jac[..., self._peaks[:, 0]] = np.swapaxes(shape, -1, -2)
+        jac[..., self._peaks[:, 1]] = np.swapaxes(peak * offset / sigma ** 2, -1, -2)
+        jac[..., self._peaks[:, 2]] = np.swapaxes(peak * (offset ** 2 / sigma ** 3 - 1 / sigma), -1, -2)
+        jac[..., self._lines[:, 0]] = x[:, None]
+        jac[..., self._lines[:, 1]] = 1.0
+        return jac
+
+    def eval_components(self, params, x):
+        """Evaluate each component separately, returned as a dict keyed by prefix like lmfit's eval_components."""
+        params = np.asarray(params, dtype=np.float64)
+        amplitude, _, _, shape = self._peak_terms(params, x)
+        peaks = amplitude * shape
+        components = {}
+        peak_number = line_number = 0
+        for kind, prefix in self.components:
+            if kind == 'gaussian':
+                components[prefix] = peaks[..., peak_number, :]
+                peak_number += 1
+            else:
+                slope, intercept = self._lines[line_number]
+                components[prefix] = params[..., slope, None] * x + params[..., intercept, None]
+                line_number += 1
+        return components
+
+    def derived(self, params, covariance=None):
+        """
+        Derived peak parameters (fwhm and height) with their standard errors.
+
+        Parameters:
+        - params: Fitted parameters, shape (..., n_params).
+        - covariance: Optional covariance matrices, shape (..., n_params, n_params).
+
+        Returns:
+        - derived: Dict name -> (value, stderr) for every '<prefix>fwhm' and '<prefix>height';
+          stderr is NaN without a covariance.
+        """
+        params = np.asarray(params, dtype=np.float64)
+        derived = {}
+        for (kind, prefix), (a, _, s) in zip([c for c in self.components if c[0] == 'gaussian'], self._peaks):
+            amplitude, sigma = params[..., a], params[..., s]
+            height = amplitude / (np.maximum(sigma, TINY) * SQRT_2PI)
+            fwhm_stderr = height_stderr = np.full(params.shape[:-1], np.nan)
+            if covariance is not None:
+                # Variances of a (near) singular fit can come out negative; report them as NaN
+                sigma_variance = covariance[..., s, s]
+                fwhm_stderr = FWHM_FACTOR * np.sqrt(np.where(sigma_variance >= 0, sigma_variance, np.nan))
+                # First-order propagation: dh/dA = h/A, dh/dsigma = -h/sigma
+                d_amplitude = 1 / (np.maximum(sigma, TINY) * SQRT_2PI)
+                d_sigma = -height / np.maximum(sigma, TINY)
+                variance = (d_amplitude ** 2 * covariance[..., a, a] + d_sigma ** 2 * covariance[..., s, s]
+                            + 2 * d_amplitude * d_sigma * covariance[..., a, s])
+                height_stderr = np.sqrt(np.where(variance >= 0, variance, np.nan))
+            derived[f'{prefix}fwhm'] = (FWHM_FACTOR * sigma, fwhm_stderr)
+            derived[f'{prefix}height'] = (height, height_stderr)
+        return derived
+
+    def fit(self, x, y, values, lower, upper, max_nfev=10000):
+        """
+        Least-squares fit of one spectrum with the analytic Jacobian (scipy's bounded trust-region solver).
+
+        Parameters:
+        - x, y: 1D arrays of wavelengths and absorbance values.
+        - values, lower, upper: Starting values and bounds, ordered like param_names.
+        - max_nfev: Maximum number of function evaluations.
+
+        Returns:
+        - result: Dict with 'values', 'stderr', 'covariance', 'chisqr', 'redchi', 'nfev' and 'success'.
+        """
+        from scipy.optimize import least_squares
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        fit = least_squares(lambda p: self.eval(p, x) - y, np.clip(values, lower, upper),
+                            jac=lambda p: self.jacobian(p, x), bounds=(lower, upper),
+                            method='trf', x_scale='jac', max_nfev=max_nfev)
+        return self._fit_result(fit.x, fit.fun, fit.jac, fit.nfev, fit.success)
+
+    def fit_batch(self, x, spectra, values, lower, upper, max_iter=200, ftol=1e-8, xtol=1e-8):
+        """
+        Fit many spectra on the same wavelength grid at once with batch_least_squares.
+
+        Parameters:
+        - x: 1D array of wavelengths.
+        - spectra: 2D array of absorbance values, wavelengths x spectra.
+        - values, lower, upper, max_iter, ftol, xtol: See batch_least_squares.
+
+        Returns:
+        - result: Dict like fit() with arrays over spectra: 'values' and 'stderr' (n_spectra, n_params),
+          'covariance' (n_spectra, n_params, n_params), 'chisqr', 'redchi', 'nfev' and 'success'.
+        """
+        return batch_least_squares(self, x, spectra, values, lower, upper, max_iter, ftol, xtol)
+
+    def _fit_result(self, values, residual, jac, nfev, success):
+        """Collect fit statistics; the covariance is (J^T J)^-1 scaled by the reduced chi-square, as in lmfit."""
+        chisqr = float(residual @ residual)
+        dof = max(1, len(residual) - len(values))
+        redchi = chisqr / dof
+        try:
+            covariance = np.linalg.inv(jac.T @ jac) * redchi
+            variance = np.diag(covariance)
+            stderr = np.sqrt(np.where(variance >= 0, variance, np.nan))
+        except np.linalg.LinAlgError:
+            covariance = None
+            stderr = np.full(len(values), np.nan)
+        return {'values': values, 'stderr': stderr, 'covariance': covariance, 'chisqr': chisqr,
+                'redchi': redchi, 'nfev': nfev, 'success': bool(success)}
+
+def batch_least_squares(model, x, spectra, values, lower, upper, max_iter=200, ftol=1e-8, xtol=1e-8):
+    """
+    Fit many spectra (or traces) on the same x grid at once with a batched Levenberg-Marquardt solver.
+
+    All spectra are stacked into an (n_spectra, n_params) problem; every iteration builds the
+    Jacobians, normal equations and damped steps for all spectra that have not converged yet with
+    array-wide operations. Each spectrum keeps its own damping factor and convergence flag. Bounds
+    are enforced by projecting steps onto them, with parameters held at a bound (and pushed further
+    out by the gradient) frozen for that step.
+
+    Parameters:
+    - model: Model with param_names, eval(params, x) and jacobian(params, x) accepting parameter
+      arrays of shape (n_spectra, n_params), e.g. GaussianBaselineModel.
+    - x: 1D array of x values (wavelengths or times).
+    - spectra: 2D array of observed values, one column per spectrum (len(x) x n_spectra).
+    - values: Starting values, shape (n_params,) or (n_spectra, n_params).
+    - lower, upper: Bounds, shape (n_params,) or (n_spectra, n_params).
+    - max_iter: Maximum number of iterations.
+    - ftol: Relative reduction of the chi-square below which a spectrum has converged.
+    - xtol: Relative step size below which a spectrum has converged.
+
+    Returns:
+    - result: Dict with arrays over spectra: 'values' and 'stderr' (n_spectra, n_params),
+      'covariance' (n_spectra, n_params, n_params), 'chisqr', 'redchi', 'nfev' and 'success'.
+      Covariance and stderr are NaN for spectra whose J^T J is singular.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    observed = np.asarray(spectra, dtype=np.float64).T
+    n_spectra, n_params = observed.shape[0], len(model.param_names)
+    lower = np.broadcast_to(np.asarray(lower, dtype=np.float64), (n_spectra, n_params))
+    upper = np.broadcast_to(np.asarray(upper, dtype=np.float64), (n_spectra, n_params))
+    params = np.clip(np.broadcast_to(values, (n_spectra, n_params)), lower, upper).astype(np.float64)
+
+    residual = model.eval(params, x) - observed
+    cost = np.einsum('ij,ij->i', residual, residual)
+    damping = np.full(n_spectra, 1e-3)
+    nfev = np.ones(n_spectra, dtype=np.int64)
+    converged = np.zeros(n_spectra, dtype=bool)
+    identity = np.eye(n_params, dtype=bool)
+
+    for _ in range(max_iter):
+        active = np.flatnonzero(~converged)
+        if len(active) == 0:
+            break
+        p = params[active]
+        jac = model.jacobian(p, x)
+        jac_t = np.swapaxes(jac, 1, 2)
+        normal = jac_t @ jac
+        gradient = (jac_t @ residual[active][:, :, None])[:, :, 0]
+
+        # Freeze parameters sitting on a bound that the descent direction would cross
+        frozen = (((p <= lower[active]) & (gradient > 0)) | ((p >= upper[active]) & (gradient < 0)))
+        gradient[frozen] = 0.0
+        normal[frozen[:, :, None] | frozen[:, None, :]] = 0.0
+        diagonal = np.where(frozen, 1.0, np.maximum(np.diagonal(normal, axis1=1, axis2=2), TINY))
+        damped = normal + identity * (damping[active, None] * diagonal)[:, :, None]
+        damped[frozen[:, :, None] & identity] = 1.0
+
+        step = -np.linalg.solve(damped, gradient[:, :, None])[:, :, 0]
+        trial = np.clip(p + step, lower[active], upper[active])
+        trial_residual = model.eval(trial, x) - observed[active]
+        trial_cost = np.einsum('ij,ij->i', trial_residual, trial_residual)
+        nfev[active] += 1
+
+        improved = trial_cost < cost[active]
+        reduction = cost[active] - trial_cost
+        step_size = np.linalg.norm(trial - p, axis=1)
+        done = ((improved & (reduction <= ftol * cost[active]))
+                | (step_size <= xtol * (np.linalg.norm(p, axis=1) + xtol))
+                | (damping[active] > 1e12))
+
+        accepted = active[improved]
+        params[accepted] = trial[improved]
+        residual[accepted] = trial_residual[improved]
+        cost[accepted] = trial_cost[improved]
+        damping[active] = np.where(improved, np.maximum(damping[active] / 10, 1e-12), damping[active] * 10)
+        converged[active[done]] = True
+
+    jac = model.jacobian(params, x)
+    dof = max(1, len(x) - n_params)
+    redchi = cost / dof
+    normal = np.swapaxes(jac, 1, 2) @ jac
+    try:
+        inverse = np.linalg.inv(normal)
+    except np.linalg.LinAlgError:
+        # Some spectra have a singular normal matrix: invert each one on its own, so the others do
+        # not depend on which spectra share their chunk, and give the singular ones NaN like _fit_result
+        inverse = np.full_like(normal, np.nan)
+        for i in range(n_spectra):
+            try:
+                inverse[i] = np.linalg.inv(normal[i])
+            except np.linalg.LinAlgError:
+                pass
+    covariance = inverse * redchi[:, None, None]
+    variance = np.diagonal(covariance, axis1=1, axis2=2)
+    stderr = np.sqrt(np.where(variance >= 0, variance, np.nan))
+    return {'values': params, 'stderr': stderr, 'covariance': covariance, 'chisqr': cost,
+            'redchi': redchi, 'nfev': nfev, 'success': converged}
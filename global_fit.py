@@ -0,0 +1,193 @@
+# global_fit.py
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import least_squares
+from dataset import as_dataset
+
+def _select_traces(datasets, wavelengths):
+    """Time window, dose axis and traces of every dataset at the target wavelengths."""
+    blocks = []
+    for name, dataset in datasets.items():
+        data = as_dataset(dataset['data'])
+        dose_rate = dataset.get('dose_rate_MGy_s', data.dose_rate)
+        if dose_rate is None:
+            raise ValueError(f"Dataset {name} has no dose rate")
+        start_time = dataset.get('start_time')
+        end_time = dataset.get('end_time')
+        start_time = data.times[0] if start_time is None else start_time
+
+        # Fit window by binary search: from start_time (inclusive) up to end_time (exclusive)
+        window = data.window(time_range=(start_time, None))
+        n_times = len(window.times) if end_time is None else int(np.searchsorted(window.times, end_time, side='left'))
+        times = window.times[:n_times]
+        if len(times) < 3:
+            raise ValueError(f"Dataset {name} has fewer than 3 time points in its fit window")
+
+        # Nearest recorded wavelength of this dataset to every target wavelength
+        rows = window.index.nearest(wavelengths)
+        traces = window.values[rows, :n_times]
+        dose = dose_rate * (times - start_time)
+        blocks.append((name, dose, traces))
+    return blocks
+
+def _basis(rates, dose):
+    """Decay basis exp(-rate * dose) of every component plus the constant, shape (n_times, n_components + 1)."""
+    return np.column_stack([np.exp(-np.outer(dose, rates)), np.ones(len(dose))])
+
+def _local_values(rates, blocks):
+    """Linear least-squares amplitudes and offsets of every trace for fixed rates."""
+    local = []
+    for _, dose, traces in blocks:
+        coefficients, *_ = np.linalg.lstsq(_basis(rates, dose), traces.T, rcond=None)
+        local.append(coefficients.T)
+    return local
+
+def _grid_rate(blocks, n_grid):
+    """Single shared rate of a logarithmic grid with the smallest total residual (amplitudes solved per trace)."""
+    max_dose = max(dose[-1] for _, dose, _ in blocks)
+    min_step = min(np.median(np.diff(dose)) for _, dose, _ in blocks)
+    grid = np.logspace(np.log10(0.1 / max_dose), np.log10(2 / min_step), n_grid)
+    residual = np.zeros(n_grid)
+    for _, dose, traces in blocks:
+        # Residual after projecting every trace onto span{exp(-rate * dose), 1}, for all rates at once
+        centred_traces = traces - traces.mean(axis=1, keepdims=True)
+        bases = np.exp(-np.outer(grid, dose))
+        centred_bases = bases - bases.mean(axis=1, keepdims=True)
+        projection = centred_traces @ centred_bases.T
+        residual += np.sum(centred_traces ** 2) - np.sum(projection ** 2, axis=0) / np.sum(centred_bases ** 2, axis=1)
+    return grid[np.argmin(residual)]
+
+def global_decay_fit(datasets, wavelengths=None, n_components=1, rates=None, n_grid=200, max_nfev=200):
+    """
+    Global exponential decay fit with decay constants shared across wavelengths and datasets.
+
+    Every trace (dataset d, wavelength w) is modelled on the dose axis of its dataset as
+    y = offset_dw + sum_j amplitude_dwj * exp(-k_j * dose), dose = dose_rate_d * (t - start_time_d),
+    so the decay constants k_j (MGy^-1) are common to all traces and the decay in time speeds up
+    with the dose rate, i.e. the transmission. All traces are solved as one least-squares problem
+    (scipy's trust-region solver with LSMR) with a sparse Jacobian: each residual depends only on
+    the k_j and on the amplitudes and offset of its own trace. The shared rates start from the best
+    single rate of a grid, with the amplitudes and offsets solved linearly for every trace, and
+    their standard errors come from the Schur complement of the per-trace blocks of J^T J.
+
+    Parameters:
+    - datasets: Dict of dataset name -> dict with 'data' (SpectralDataset, or DataFrame with
+      wavelengths as index and numeric times in seconds as columns, e.g. from spec_io.read_spectra),
+      'dose_rate_MGy_s' (taken from the SpectralDataset's dose_rate if missing) and optionally
+      'start_time' (seconds; zero dose, first time fitted) and 'end_time' (seconds,
+      exclusive), e.g. the onset and burn times from dose_analysis_driver.
+    - wavelengths: Wavelengths to fit (nearest recorded wavelength of each dataset); all wavelengths
+      of the first dataset if not given.
+    - n_components: Number of shared exponential components.
+    - rates: Optional starting decay constants (MGy^-1), one per component.
+    - n_grid: Number of rates in the starting grid.
+    - max_nfev: Maximum number of function evaluations of the solver.
+
+    Returns:
+    - result: Dict with 'rates' and 'rates_stderr' (MGy^-1), 'half_doses' (ln 2 / k, MGy),
+      'traces' (DataFrame indexed by dataset and wavelength with amplitude_<j>, offset and r2),
+      'chisqr', 'redchi', 'nfev' and 'success'.
+    """
+    if wavelengths is None:
+        wavelengths = as_dataset(next(iter(datasets.values()))['data']).wavelengths
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    blocks = _select_traces(datasets, wavelengths)
+    n_waves, n_local = len(wavelengths), n_components + 1
+
+    if rates is None:
+        rate = _grid_rate(blocks, n_grid)
+        rates = rate * np.logspace(-1, 1, n_components) if n_components > 1 else [rate]
+    rates = np.asarray(rates, dtype=np.float64)
+    if len(rates) != n_components:
+        raise ValueError(f"Expected {n_components} starting rates, got {len(rates)}")
+
+    # Parameter vector: the shared rates, then amplitudes and offset of every trace, dataset by dataset
+    x0 = np.concatenate([rates] + [local.ravel() for local in _local_values(rates, blocks)])
+    offsets = np.cumsum([0] + [traces.size for _, _, traces in blocks])
+    observed = np.concatenate([traces.ravel() for _, _, traces in blocks])
+
+    # Sparsity pattern (fixed): residual row -> its trace's local parameters and the shared rates
+    rows, cols = [], []
+    for b, (_, dose, traces) in enumerate(blocks):
+        n_times = len(dose)
+        row = offsets[b] + np.arange(traces.size)
+        trace = b * n_waves + np.arange(traces.size) // n_times
+        rows += [np.repeat(row, n_components), np.repeat(row, n_local)]
+        cols += [np.tile(np.arange(n_components), traces.size),
+                 (n_components + trace[:, None] * n_local + np.arange(n_local)).ravel()]
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    shape = (len(observed), len(x0))
+
+    def unpack(params):
+        local = params[n_components:].reshape(len(blocks), n_waves, n_local)
+        return params[:n_components], local
+
+    def residuals(params):
+        rates, local = unpack(params)
+        model = [local[b] @ _basis(rates, dose).T for b, (_, dose, _) in enumerate(blocks)]
+        return np.concatenate([m.ravel() for m in model]) - observed
+
+    def jacobian(params):
+        rates, local = unpack(params)
+        rate_values, local_values = [], []
+        for b, (_, dose, _) in enumerate(blocks):
+            basis = _basis(rates, dose)
+            # d/dk_j = -amplitude_j * dose * exp(-k_j * dose), shape (n_waves, n_times, n_components)
+            rate_values.append((-local[b][:, None, :n_components] * (dose[:, None] * basis[:, :n_components])).ravel())
+            local_values.append(np.broadcast_to(basis, (n_waves,) + basis.shape).ravel())
+        values = []
+        for rate_value, local_value in zip(rate_values, local_values):
+            values += [rate_value, local_value]
+        values = np.concatenate(values)
+        return sparse.csr_matrix((values, (rows, cols)), shape=shape)
+
+    lower = np.full(len(x0), -np.inf)
+    lower[:n_components] = 0.0
+    fit = least_squares(residuals, np.maximum(x0, lower), jac=jacobian, bounds=(lower, np.inf), method='trf',
+                        tr_solver='lsmr', x_scale='jac', max_nfev=max_nfev)
+
+    rates, local = unpack(fit.x)
+    chisqr = float(fit.fun @ fit.fun)
+    redchi = chisqr / max(1, len(observed) - len(fit.x))
+
+    # Covariance of the rates: inverse of the Schur complement sum_b G_b^T (I - P_b) G_b, where G_b
+    # holds the rate derivatives of trace b and P_b projects onto its (per-dataset) local basis
+    schur = np.zeros((n_components, n_components))
+    for b, (_, dose, _) in enumerate(blocks):
+        basis = _basis(rates, dose)
+        q, _ = np.linalg.qr(basis)
+        g = -local[b][:, None, :n_components] * (dose[:, None] * basis[:, :n_components])
+        g = g - q @ (q.T @ g)
+        schur += np.einsum('wti,wtj->ij', g, g)
+    try:
+        variance = np.diag(np.linalg.inv(schur)) * redchi
+        rates_stderr = np.sqrt(np.where(variance >= 0, variance, np.nan))
+    except np.linalg.LinAlgError:
+        rates_stderr = np.full(n_components, np.nan)
+
+    names = list(datasets)
+    residual = fit.fun.reshape(-1)
+    table = []
+    for b, (_, dose, traces) in enumerate(blocks):
+        trace_residual = residual[offsets[b]:offsets[b + 1]].reshape(traces.shape)
+        ss_tot = np.sum((traces - traces.mean(axis=1, keepdims=True)) ** 2, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r2 = np.where(ss_tot > 0, 1 - np.sum(trace_residual ** 2, axis=1) / ss_tot, np.nan)
+        columns = {f'amplitude_{j + 1}': local[b][:, j] for j in range(n_components)}
+        columns.update({'offset': local[b][:, n_components], 'r2': r2})
+        table.append(pd.DataFrame(columns, index=pd.MultiIndex.from_product(
+            [[names[b]], wavelengths], names=['dataset', 'Wavelength'])))
+
+    with np.errstate(divide='ignore'):
+        half_doses = np.log(2) / rates
+    return {
+        'rates': rates,
+        'rates_stderr': rates_stderr,
+        'half_doses': half_doses,
+        'traces': pd.concat(table),
+        'chisqr': chisqr,
+        'redchi': redchi,
+        'nfev': fit.nfev,
+        'success': fit.success,
+    }
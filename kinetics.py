@@ -0,0 +1,121 @@
+# kinetics.py
+import numpy as np
+import pandas as pd
+from gaussian_model import batch_least_squares
+from dataset import as_dataset
+
+class ExponentialDecayModel:
+    """
+    Single exponential on a constant: y = amplitude * exp(-rate * t) + offset, with analytic derivatives.
+
+    Like GaussianBaselineModel, the parameter vectors may carry leading batch dimensions, e.g.
+    (n_traces, 3), so the model can be passed to gaussian_model.batch_least_squares.
+    """
+
+    param_names = ['amplitude', 'rate', 'offset']
+
+    def eval(self, params, t):
+        """Evaluate the model, shape (..., len(t))."""
+        params = np.asarray(params, dtype=np.float64)
+        return params[..., 0, None] * np.exp(-params[..., 1, None] * t) + params[..., 2, None]
+
+    def jacobian(self, params, t):
+        """
+        Analytic derivatives of the model with respect to the parameters.
+
+        Returns:
+        - jac: Array of shape (..., len(t), 3).
+        """
+        params = np.asarray(params, dtype=np.float64)
+        decay = np.exp(-params[..., 1, None] * t)
+        return np.stack([decay, -params[..., 0, None] * t * decay, np.ones_like(decay)], axis=-1)
+
+def grid_start_values(t, traces, n_rates=200):
+    """
+    Starting values for exponential decay fits of many traces, from a grid of decay rates.
+
+    For a fixed rate the model is linear in amplitude and offset. The decay basis exp(-rate * t) is
+    the same for every trace, so the best rate of the grid for all traces is found with one matrix
+    product of the centred traces with the centred bases, and amplitude and offset follow in closed
+    form. The grid runs from a tenth of an e-fold over the trace to two e-folds per time step.
+
+    Parameters:
+    - t: 1D array of times (seconds), starting at 0.
+    - traces: 2D array with one trace per row.
+    - n_rates: Number of decay rates in the grid.
+
+    Returns:
+    - values: Array (n_traces, 3) of amplitude, rate and offset.
+    """
+    span = t[-1] - t[0]
+    step = np.median(np.diff(t))
+    rates = np.logspace(np.log10(0.1 / span), np.log10(2 / step), n_rates)
+
+    bases = np.exp(-np.outer(rates, t))
+    basis_mean = bases.mean(axis=1)
+    centred_bases = bases - basis_mean[:, None]
+    basis_norm = np.einsum('ij,ij->i', centred_bases, centred_bases)
+    trace_mean = traces.mean(axis=1)
+
+    # Reduction of the residual sum of squares by each rate: <u, y>^2 / <u, u> (centred)
+    projection = (traces - trace_mean[:, None]) @ centred_bases.T
+    best = np.argmax(projection ** 2 / basis_norm, axis=1)
+
+    amplitude = projection[np.arange(len(traces)), best] / basis_norm[best]
+    offset = trace_mean - amplitude * basis_mean[best]
+    return np.column_stack([amplitude, rates[best], offset])
+
+def kinetics_map(data, start_time=None, max_time=None, n_rates=200, max_iter=200):
+    """
+    Exponential decay fit of the time trace at every wavelength of a dataset at once.
+
+    Each trace is fitted with y = amplitude * exp(-rate * (t - t0)) + offset, t0 being the first
+    time point fitted. All traces are initialised together on a grid of rates (grid_start_values)
+    and refined together with the batched Levenberg-Marquardt solver of gaussian_model
+    (rate >= 0). Rising traces, e.g. of species formed during the exposure, get a negative amplitude.
+
+    Parameters:
+    - data: SpectralDataset, or DataFrame with wavelengths as index and numeric times (seconds) as
+      columns, e.g. from spec_io.read_spectra.
+    - start_time: First time point (seconds) to fit, e.g. to skip the points before the onset.
+    - max_time: Last time point (seconds) to fit.
+    - n_rates: Number of decay rates in the initialisation grid.
+    - max_iter: Maximum number of solver iterations.
+
+    Returns:
+    - kinetics: DataFrame indexed by wavelength with amplitude (at t0), rate (s^-1), tau = 1/rate (s),
+      offset and their standard errors, plus r2, chisqr and success.
+    """
+    dataset = as_dataset(data).window(time_range=(start_time, max_time))
+    t = dataset.times
+    if len(t) < 4:
+        raise ValueError(f"Need at least 4 time points to fit the kinetics, got {len(t)}")
+    t = t - t[0]
+    traces = dataset.values
+
+    model = ExponentialDecayModel()
+    values = grid_start_values(t, traces, n_rates)
+    result = batch_least_squares(model, t, traces.T, values, [-np.inf, 0, -np.inf], [np.inf, np.inf, np.inf],
+                                 max_iter=max_iter)
+
+    amplitude, rate, offset = result['values'].T
+    amplitude_stderr, rate_stderr, offset_stderr = result['stderr'].T
+    ss_tot = np.sum((traces - traces.mean(axis=1, keepdims=True)) ** 2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = 1 / rate
+        tau_stderr = rate_stderr / rate ** 2
+        r2 = np.where(ss_tot > 0, 1 - result['chisqr'] / ss_tot, np.nan)
+
+    return pd.DataFrame({
+        'amplitude': amplitude,
+        'amplitude_stderr': amplitude_stderr,
+        'rate': rate,
+        'rate_stderr': rate_stderr,
+        'tau': tau,
+        'tau_stderr': tau_stderr,
+        'offset': offset,
+        'offset_stderr': offset_stderr,
+        'r2': r2,
+        'chisqr': result['chisqr'],
+        'success': result['success'],
+    }, index=pd.Index(dataset.wavelengths, name='Wavelength'))
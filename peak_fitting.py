@@ -0,0 +1,396 @@
+# peak_fitting.py
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Composite models built by build_model, cached per process so each worker only builds them once
+_model_cache = {}
+
+# Largest chunk of time points between checkpoints, when fit_time_series is given a checkpoint
+CHECKPOINT_CHUNK_SIZE = 200
+
+def _model_class(name):
+    """Return the lmfit model class for a model_spec entry."""
+    from lmfit import models
+    model_classes = {
+        'gaussian': models.GaussianModel,
+        'lorentzian': models.LorentzianModel,
+        'voigt': models.VoigtModel,
+        'linear': models.LinearModel,
+        'exponential': models.ExponentialModel,
+    }
+    if name not in model_classes:
+        raise ValueError(f"Unknown model '{name}', expected one of {sorted(model_classes)}")
+    return model_classes[name]
+
+def build_model(model_spec):
+    """
+    Build a composite lmfit model and its starting parameters from a model specification.
+
+    Parameters:
+    - model_spec: List of components, each a dict with 'model' (e.g. 'gaussian', 'linear'),
+      'prefix' (e.g. 'peak1_') and 'params' (parameter name -> dict of value/min/max), e.g.
+      {'model': 'gaussian', 'prefix': 'peak1_', 'params': {'center': dict(value=330)}}.
+
+    Returns:
+    - model: The composite lmfit model (sum of the components).
+    - params: lmfit Parameters with the starting values and bounds.
+    """
+    model = None
+    params = None
+    for component in model_spec:
+        component_model = _model_class(component['model'])(prefix=component['prefix'])
+        component_params = component_model.make_params(**component.get('params', {}))
+        model = component_model if model is None else model + component_model
+        params = component_params if params is None else params + component_params
+    return model, params
+
+def _cached_model(model_spec):
+    """
+    Return the model for model_spec with the parameters to fit and the full parameter set.
+
+    Derived parameters (e.g. fwhm and height, defined by expressions) do not enter the model function;
+    they are held fixed during the fit, so the expressions are not re-evaluated on every iteration,
+    and filled in once per fit by _result_row.
+    """
+    key = repr(model_spec)
+    if key not in _model_cache:
+        model, params = build_model(model_spec)
+        fit_params = params.copy()
+        for name, param in params.items():
+            if param.expr is not None:
+                fit_params[name].set(expr='', vary=False)
+        _model_cache[key] = (model, fit_params, params)
+    model, fit_params, params = _model_cache[key]
+    return model, fit_params.copy(), params
+
+def _warm_start(params, reference):
+    """
+    Start from the reference fit: parameters other than amplitudes are held within +/-5% of their
+    reference value, amplitudes start from the reference value and only stay non-negative.
+    """
+    for name, value in reference.items():
+        if 'amplitude' not in name:
+            params[name].set(value=value, min=value * 0.95, max=value * 1.05)
+        else:
+            params[name].set(value=value, min=0)
+    return params
+
+def _warm_start_bounds(param_names, reference, lower, upper):
+    """Array version of _warm_start: starting values and bounds around the reference fit."""
+    values = np.array([reference[name] for name in param_names])
+    lower, upper = lower.copy(), upper.copy()
+    for i, name in enumerate(param_names):
+        if 'amplitude' not in name:
+            lower[i], upper[i] = sorted((values[i] * 0.95, values[i] * 1.05))
+        else:
+            lower[i] = 0.0
+    return np.clip(values, lower, upper), lower, upper
+
+def _result_row(out, all_params):
+    """Flatten a ModelResult into a row of the results table, including the derived parameters."""
+    params = all_params.copy()
+    for name, param in out.params.items():
+        if params[name].expr is None:
+            params[name].value = param.value
+    params.update_constraints()
+
+    row = {}
+    for name, param in params.items():
+        stderr = out.params[name].stderr if param.expr is None else None
+        row[name] = param.value
+        row[f'{name}_stderr'] = stderr if stderr is not None else np.nan
+    row.update({'chisqr': out.chisqr, 'redchi': out.redchi, 'success': out.success, 'nfev': out.nfev})
+    return row
+
+def _free_values(out):
+    """Values of the fitted parameters (used for warm starts)."""
+    return {name: param.value for name, param in out.params.items() if param.vary}
+
+def _analytic_row(model, result):
+    """Flatten a GaussianBaselineModel fit into a row with the same columns as _result_row."""
+    values = dict(zip(model.param_names, zip(result['values'], result['stderr'])))
+    values.update(model.derived(result['values'], result['covariance']))
+
+    row = {}
+    for name in model.param_names:
+        names = [name]
+        if name.endswith('sigma'):
+            prefix = name[:-len('sigma')]
+            names += [f'{prefix}fwhm', f'{prefix}height']
+        for column in names:
+            row[column] = float(values[column][0])
+            row[f'{column}_stderr'] = float(values[column][1])
+    row.update({key: result[key] for key in ('chisqr', 'redchi', 'success', 'nfev')})
+    return row
+
+def _analytic_report(row, param_names):
+    """Short text report of an analytic fit, in the spirit of lmfit's fit_report."""
+    lines = ['[[Fit Statistics]]',
+             f"    # function evals   = {row['nfev']}",
+             f"    chi-square         = {row['chisqr']:.8g}",
+             f"    reduced chi-square = {row['redchi']:.8g}",
+             '[[Variables]]']
+    for name in param_names:
+        lines.append(f"    {name}: {row[name]:.8g} +/- {row[f'{name}_stderr']:.8g}")
+    return '\n'.join(lines) + '\n'
+
+def _make_fitter(model_spec, x, fit_kwargs, engine):
+    """
+    Return fit(y, reference, report) -> (row, values, report_text) for the chosen engine.
+
+    reference is None for a cold start from model_spec, or the parameter values of a previous fit
+    to warm-start from; values are this fit's parameter values (the next reference).
+    """
+    if engine == 'lmfit':
+        model, default_params, all_params = _cached_model(model_spec)
+
+        def fit(y, reference, report):
+            params = default_params.copy()
+            if reference is not None:
+                _warm_start(params, reference)
+            out = model.fit(y, params, x=x, **fit_kwargs)
+            report_text = out.fit_report(min_correl=0.3) if report else None
+            return _result_row(out, all_params), _free_values(out), report_text
+
+    elif engine == 'analytic':
+        from gaussian_model import GaussianBaselineModel
+        model = GaussianBaselineModel.from_model_spec(model_spec)
+        initial, lower, upper = model.initial_params(model_spec)
+
+        def fit(y, reference, report):
+            values, fit_lower, fit_upper = initial, lower, upper
+            if reference is not None:
+                values, fit_lower, fit_upper = _warm_start_bounds(model.param_names, reference, lower, upper)
+            result = model.fit(x, y, values, fit_lower, fit_upper, max_nfev=fit_kwargs['max_nfev'])
+            row = _analytic_row(model, result)
+            report_text = _analytic_report(row, model.param_names) if report else None
+            return row, dict(zip(model.param_names, result['values'])), report_text
+
+    else:
+        raise ValueError(f"Unknown fitting engine '{engine}', expected 'lmfit', 'analytic' or 'batch'")
+    return fit
+
+def _fit_chunk_batch(model_spec, x, time_points, spectra, reference, fit_kwargs, report):
+    """Fit a block of spectra in one call of the batched Levenberg-Marquardt solver (engine='batch')."""
+    from gaussian_model import GaussianBaselineModel
+    model = GaussianBaselineModel.from_model_spec(model_spec)
+    values, lower, upper = model.initial_params(model_spec)
+    if reference is not None:
+        values, lower, upper = _warm_start_bounds(model.param_names, reference, lower, upper)
+    result = model.fit_batch(x, spectra, values, lower, upper, max_iter=fit_kwargs['max_nfev'])
+
+    rows, reports = [], []
+    for i, time_point in enumerate(time_points):
+        row = _analytic_row(model, {key: value[i] for key, value in result.items()})
+        rows.append({'time': time_point, **row})
+        if report:
+            reports.append(f'\nSpectra time_point: {time_point}\n' + _analytic_report(row, model.param_names))
+    return rows, reports, dict(zip(model.param_names, result['values'][-1]))
+
+def _fit_chunk(model_spec, x, time_points, spectra, reference, fit_kwargs, chain, report, engine='lmfit'):
+    """
+    Fit a contiguous block of spectra (columns of `spectra`) with the same model.
+
+    Defined at module level so it can run in a worker process.
+
+    Returns:
+    - rows: List of result rows, one per time point.
+    - reports: List of fit report strings (empty unless report is True).
+    - values: Parameter values of the last fit.
+    """
+    if engine == 'batch':
+        if chain:
+            raise ValueError("chain=True needs one fit after another, use the 'analytic' or 'lmfit' engine")
+        return _fit_chunk_batch(model_spec, x, time_points, spectra, reference, fit_kwargs, report)
+
+    fit = _make_fitter(model_spec, x, fit_kwargs, engine)
+    rows, reports, values = [], [], None
+    for i, time_point in enumerate(time_points):
+        row, values, report_text = fit(spectra[:, i], reference, report)
+
+        rows.append({'time': time_point, **row})
+        if report:
+            reports.append(f'\nSpectra time_point: {time_point}\n' + report_text)
+        if chain:
+            reference = values
+    return rows, reports, values
+
+def _json_default(value):
+    """Convert NumPy scalars for json.dump."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class _Checkpoint:
+    """
+    On-disk state of a fit_time_series run: the warm-start reference and the completed rows (and
+    text reports) by time point index, tagged with a fingerprint of the data and fit settings so a
+    checkpoint is only resumed by the same run.
+    """
+
+    def __init__(self, file_path, key, interval):
+        self.file_path = file_path
+        self.key = key
+        self.interval = interval
+        self._last_save = time.monotonic()
+
+    def load(self):
+        """Return (reference, rows, reports) from a matching checkpoint, or None."""
+        if not os.path.exists(self.file_path):
+            return None
+        with open(self.file_path) as f:
+            state = json.load(f)
+        if state.get('key') != self.key:
+            print(f"Checkpoint {self.file_path} is from a different run, starting from the first time point")
+            return None
+        rows = {int(index): row for index, row in state['rows'].items()}
+        reports = {int(index): text for index, text in state['reports'].items()}
+        return state['reference'], rows, reports
+
+    def save(self, reference, rows, reports, force=False):
+        """Write the state (atomically), at most once per interval seconds unless force is set."""
+        if not force and time.monotonic() - self._last_save < self.interval:
+            return
+        state = {'key': self.key, 'reference': reference, 'rows': rows, 'reports': reports}
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, default=_json_default)
+        os.replace(tmp_path, self.file_path)
+        self._last_save = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+def _run_key(x, spectra, time_points, model_spec, settings):
+    """Fingerprint of the data and settings of a fitting run."""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(x).tobytes())
+    digest.update(np.ascontiguousarray(spectra).tobytes())
+    digest.update(repr((time_points, model_spec, settings)).encode())
+    return digest.hexdigest()
+
+def _contiguous_runs(indices):
+    """Split sorted integer indices into (start, stop) ranges of consecutive values."""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    return [tuple(run) for run in runs]
+
+def fit_time_series(data, model_spec, jobs=1, chunk_size=None, chain=False, writer=None,
+                    method='leastsq', max_nfev=10000, engine='lmfit', checkpoint=None, checkpoint_interval=60):
+    """
+    Fit the same peak model to every time point of a spectral time series.
+
+    The first time point is fitted from the starting values in model_spec; all later time points are
+    warm-started from that fit (other parameters within +/-5%, amplitudes free), as in spec_analysis.py.
+    Those fits are split into contiguous chunks of time points and run in a process pool when jobs > 1;
+    with chain=True each fit in a chunk is warm-started from the previous time point instead.
+
+    With a checkpoint path, the completed time points and the warm-start reference are saved to it
+    while the run progresses. If the run dies, calling fit_time_series again with the same data,
+    model and settings resumes from the saved state and only fits the missing time points. The
+    checkpoint is removed once the run has finished.
+
+    Parameters:
+    - data: DataFrame with wavelengths as index and time points as columns.
+    - model_spec: Model specification, see build_model.
+    - jobs: Number of worker processes; 0 uses all cores, 1 fits in this process.
+    - chunk_size: Number of consecutive time points per task (default: about 4 chunks per worker,
+      one chunk per worker for the batch engine; at most CHECKPOINT_CHUNK_SIZE with a checkpoint).
+    - chain: Warm-start each fit from the previous time point in its chunk.
+    - writer: Optional fit_results.FitResultsWriter; the rows (and, if it writes reports, the text fit
+      reports) are streamed to it in time order as the chunks finish.
+    - method, max_nfev: Passed to lmfit's Model.fit (the analytic engine only uses max_nfev, the
+      batch engine uses it as its iteration limit).
+    - engine: 'lmfit' fits the lmfit models built from model_spec; 'analytic' uses
+      gaussian_model.GaussianBaselineModel (gaussian and linear components only), which supplies
+      analytic derivatives and gives the same columns much faster; 'batch' fits each chunk of time
+      points at once with GaussianBaselineModel.fit_batch (not with chain=True), after fitting the
+      first time point with the analytic engine.
+    - checkpoint: Optional path of a JSON checkpoint file to save progress to and resume from.
+    - checkpoint_interval: Minimum number of seconds between checkpoint writes.
+
+    Returns:
+    - results: DataFrame indexed by time point, with the value and stderr of every parameter
+      plus chisqr, redchi, success and nfev.
+    """
+    x = data.index.values.astype(float)
+    spectra = data.to_numpy(dtype=np.float64)
+    time_points = list(data.columns)
+    fit_kwargs = {'method': method, 'max_nfev': max_nfev}
+    report = writer is not None and writer.report
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    # Completed fits by time point index; rows are streamed to the writer in time order
+    rows, reports = {}, {}
+    written = 0
+    state = None
+    if checkpoint is not None:
+        key = _run_key(x, spectra, time_points, model_spec, (engine, chain, report, fit_kwargs))
+        checkpoint = _Checkpoint(checkpoint, key, checkpoint_interval)
+        state = checkpoint.load()
+
+    def collect(start, chunk_rows, chunk_reports):
+        nonlocal written
+        for offset, row in enumerate(chunk_rows):
+            rows[start + offset] = row
+            if report:
+                reports[start + offset] = chunk_reports[offset]
+        if writer is not None:
+            stop = written
+            while stop in rows:
+                stop += 1
+            writer.write([rows[i] for i in range(written, stop)])
+            writer.write_report([reports[i] for i in range(written, stop) if i in reports])
+            written = stop
+
+    if state is not None:
+        reference, restored_rows, restored_reports = state
+        print(f"Resuming from checkpoint {checkpoint.file_path}: {len(restored_rows)} of {len(time_points)} time points done")
+        for index in sorted(restored_rows):
+            collect(index, [restored_rows[index]], [restored_reports.get(index)])
+    else:
+        # The first fit provides the warm-start reference for all the others. It starts cold from model_spec,
+        # where the trust-region solver of the analytic engine is more robust than the batched one
+        first_engine = 'analytic' if engine == 'batch' else engine
+        first_rows, first_reports, reference = _fit_chunk(model_spec, x, time_points[:1], spectra[:, :1], None,
+                                                          fit_kwargs, False, report, first_engine)
+        collect(0, first_rows, first_reports)
+
+    pending = [index for index in range(len(time_points)) if index not in rows]
+    if chunk_size is None:
+        chunks_per_job = 1 if engine == 'batch' else 4
+        chunk_size = max(1, -(-len(pending) // (chunks_per_job * jobs)))
+        if checkpoint is not None:
+            chunk_size = min(chunk_size, CHECKPOINT_CHUNK_SIZE)
+    chunks = [(begin, min(begin + chunk_size, stop))
+              for start, stop in _contiguous_runs(pending) for begin in range(start, stop, chunk_size)]
+    tasks = [(model_spec, x, time_points[start:stop], spectra[:, start:stop], reference, fit_kwargs, chain, report, engine)
+             for start, stop in chunks]
+
+    def run(chunk_results):
+        for (start, _), (chunk_rows, chunk_reports, _) in zip(chunks, chunk_results):
+            collect(start, chunk_rows, chunk_reports)
+            if checkpoint is not None:
+                checkpoint.save(reference, rows, reports)
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            run(executor.map(_fit_chunk, *zip(*tasks)))
+    else:
+        run(_fit_chunk(*task) for task in tasks)
+
+    if checkpoint is not None:
+        checkpoint.remove()
+    return pd.DataFrame([rows[i] for i in range(len(time_points))]).set_index('time')
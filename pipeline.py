@@ -0,0 +1,76 @@
+# pipeline.py
+import numpy as np
+import pandas as pd
+from spec_io import parse_time_labels
+
+class SpectralPipeline:
+    """
+    Runs the processing stages of spec_main on a single float64 array, in place.
+
+    The pipeline owns one wavelengths x time block plus its wavelength and time axes. Background and
+    baseline subtraction modify the block in place and smoothing swaps in its result, so at most one
+    extra copy of the data exists at any time. A DataFrame is only built at the output boundary
+    (to_frame / save_csv), and it shares memory with the block.
+    """
+
+    def __init__(self, values, wavelengths, times, diagnostics=None):
+        """
+        Parameters:
+        - values: 2D array of absorbance data, wavelengths x time points (used directly if it is
+          already a writeable, C-contiguous float64 array).
+        - wavelengths: The wavelengths corresponding to the rows of values.
+        - times: Times in seconds of the columns of values (time labels such as '0.1s' are converted).
+        - diagnostics: Optional DiagnosticPlots collector the stages queue their plots on.
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if not values.flags.writeable:
+            values = values.copy()
+        self.values = values
+        self.wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        self.times = parse_time_labels(times)
+        self.diagnostics = diagnostics
+
+    @classmethod
+    def from_frame(cls, df, diagnostics=None):
+        """Create a pipeline from a DataFrame with wavelengths as index and times as columns (copies the data)."""
+        return cls(df.to_numpy(dtype=np.float64, copy=True), df.index.values, df.columns, diagnostics)
+
+    def subtract_background(self, background_data, timepoints_to_plot=[0, 10, 100], output_dir="background_subtraction"):
+        """Subtract an interpolated background spectrum in place (see background_subtraction.subtract_background_array)."""
+        from background_subtraction import subtract_background_array
+        subtract_background_array(self.values, self.wavelengths, background_data, self.times,
+                                  timepoints_to_plot, output_dir, diagnostics=self.diagnostics)
+        return self
+
+    def baseline_correct(self, poly_order=4, tol=1e-3, num_std=1, output_dir="baseline_correction"):
+        """Subtract IModPoly baselines in place (see baseline_correction.baseline_correct_array)."""
+        from baseline_correction import baseline_correct_array
+        baseline_correct_array(self.values, self.wavelengths, poly_order=poly_order, tol=tol, num_std=num_std,
+                               output_dir=output_dir, diagnostics=self.diagnostics)
+        return self
+
+    def smooth(self, window_length=11, polyorder=2, time_window_length=None, time_polyorder=None, output_dir="smoothing_plots"):
+        """Savitzky-Golay smooth the block, replacing it with the smoothed result (see smoothing.smooth_array)."""
+        from smoothing import smooth_array
+        self.values = smooth_array(self.values, window_length, polyorder, time_window_length, time_polyorder,
+                                   wavelengths=self.wavelengths, output_dir=output_dir, diagnostics=self.diagnostics)
+        return self
+
+    def to_frame(self):
+        """
+        Return the block as a DataFrame with 'Wavelength' as index and times (seconds) as columns.
+
+        The DataFrame shares memory with the pipeline, so write or copy it before running further stages.
+        """
+        index = pd.Index(self.wavelengths, name='Wavelength')
+        return pd.DataFrame(self.values, index=index, columns=pd.Index(self.times), copy=False)
+
+    def to_dataset(self):
+        """Return the block as a dataset.SpectralDataset sharing memory with the pipeline (same caveat as to_frame)."""
+        from dataset import SpectralDataset
+        return SpectralDataset(self.values, self.wavelengths, self.times)
+
+    def save(self, output_path, fmt=None):
+        """Write the current block in one of spec_io.FORMATS (inferred from the extension if fmt is not given)."""
+        from spec_io import write_spectra
+        write_spectra(output_path, self.values, self.wavelengths, self.times, fmt=fmt)
@@ -0,0 +1,134 @@
+# replicate_average.py
+import numpy as np
+import pandas as pd
+
+class ReplicateAverager:
+    """
+    Streaming mean and variance of replicate spectra on a shared wavelength grid.
+
+    Each replicate is folded into running per-cell counts, sums and sums of squared deviations
+    (Chan et al. pairwise update), so averaging any number of replicates only keeps one grid's worth
+    of statistics in memory. The result matches concatenating the replicates and grouping by
+    'Wavelength': wavelengths and times (seconds) are the union over all replicates, both kept
+    sorted, duplicate wavelengths are averaged together and NaN values are skipped.
+    """
+
+    def __init__(self):
+        self.wavelengths = np.empty(0, dtype=np.float64)
+        self.times = np.empty(0, dtype=np.float64)
+        self.n_replicates = 0
+        self._count = np.zeros((0, 0), dtype=np.int64)
+        self._sum = np.zeros((0, 0), dtype=np.float64)
+        self._m2 = np.zeros((0, 0), dtype=np.float64)
+
+    def _grow(self, wavelengths, times):
+        """Extend the grid with any new wavelengths/times and return the row and column positions."""
+        grid = self.wavelengths
+        if not np.array_equal(grid, wavelengths):
+            grid = np.union1d(self.wavelengths, wavelengths)
+        time_grid = self.times
+        if not np.array_equal(time_grid, times):
+            time_grid = np.union1d(self.times, times)
+
+        if len(grid) != len(self.wavelengths) or len(time_grid) != len(self.times):
+            shape = (len(grid), len(time_grid))
+            old_rows = np.searchsorted(grid, self.wavelengths)
+            old_columns = np.searchsorted(time_grid, self.times)
+            for name in ('_count', '_sum', '_m2'):
+                old = getattr(self, name)
+                grown = np.zeros(shape, dtype=old.dtype)
+                grown[np.ix_(old_rows, old_columns)] = old
+                setattr(self, name, grown)
+            self.wavelengths = grid
+            self.times = time_grid
+
+        rows = np.searchsorted(self.wavelengths, wavelengths)
+        column_positions = np.searchsorted(self.times, times)
+        return rows, column_positions
+
+    def add(self, wavelengths, values, times, new_replicate=True):
+        """
+        Fold one replicate into the running statistics.
+
+        Parameters:
+        - wavelengths: 1D array of the replicate's wavelengths (one per row of values).
+        - values: 2D array of absorbance values, wavelengths x time points.
+        - times: Times in seconds of the columns of values (e.g. from spec_import.time_axis); they
+          must be distinct.
+        - new_replicate: False when the rows continue a replicate that was partly added before (e.g.
+          rows appended to a file that is still being written); they must not repeat rows already
+          added for it. Only affects n_replicates.
+        """
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        if len(np.unique(times)) != len(times):
+            raise ValueError("Time points of a replicate must be distinct")
+
+        # Per-wavelength statistics of this replicate (rows with repeated wavelengths are pooled)
+        unique_wavelengths, inverse = np.unique(wavelengths, return_inverse=True)
+        valid = ~np.isnan(values)
+        if len(unique_wavelengths) == len(wavelengths):
+            order = np.argsort(wavelengths, kind='stable')
+            count_b = valid[order].astype(np.int64)
+            sum_b = np.where(valid, values, 0.0)[order]
+            m2_b = np.zeros_like(sum_b)
+        else:
+            shape = (len(unique_wavelengths), values.shape[1])
+            filled = np.where(valid, values, 0.0)
+            count_b = np.zeros(shape, dtype=np.int64)
+            sum_b = np.zeros(shape)
+            np.add.at(count_b, inverse, valid)
+            np.add.at(sum_b, inverse, filled)
+            mean_b = np.divide(sum_b, count_b, out=np.zeros(shape), where=count_b > 0)
+            m2_b = np.zeros(shape)
+            np.add.at(m2_b, inverse, np.where(valid, (values - mean_b[inverse]) ** 2, 0.0))
+
+        # Columns in time order, like the grid (a no-op for the ascending axis of spec_import.time_axis)
+        time_order = np.argsort(times, kind='stable')
+        if not np.array_equal(time_order, np.arange(len(times))):
+            times = times[time_order]
+            count_b, sum_b, m2_b = count_b[:, time_order], sum_b[:, time_order], m2_b[:, time_order]
+
+        rows, column_positions = self._grow(unique_wavelengths, times)
+        same_grid = len(rows) == len(self.wavelengths) and len(column_positions) == len(self.times)
+        if same_grid:
+            index = (slice(None), slice(None))
+        else:
+            index = np.ix_(rows, column_positions)
+
+        count_a = self._count[index]
+        sum_a = self._sum[index]
+        m2_a = self._m2[index]
+
+        # Merge the two sets of statistics: M2 = M2_a + M2_b + delta^2 * n_a * n_b / n
+        count = count_a + count_b
+        both = (count_a > 0) & (count_b > 0)
+        mean_a = np.divide(sum_a, count_a, out=np.zeros_like(sum_a), where=both)
+        mean_b = np.divide(sum_b, count_b, out=np.zeros_like(sum_b), where=both)
+        delta = mean_b - mean_a
+        correction = np.divide(delta ** 2 * count_a * count_b, count, out=np.zeros_like(delta), where=both)
+
+        self._count[index] = count
+        self._sum[index] = sum_a + sum_b
+        self._m2[index] = m2_a + m2_b + correction
+        if new_replicate:
+            self.n_replicates += 1
+
+    def _frame(self, values):
+        index = pd.Index(self.wavelengths, name='Wavelength')
+        return pd.DataFrame(values, index=index, columns=pd.Index(self.times))
+
+    def mean_values(self):
+        """Return the mean spectrum as a new 2D float64 array, wavelengths x time points."""
+        return np.divide(self._sum, self._count, out=np.full(self._sum.shape, np.nan), where=self._count > 0)
+
+    def mean(self):
+        """Return the mean spectrum as a DataFrame with 'Wavelength' as index and times (seconds) as columns."""
+        return self._frame(self.mean_values())
+
+    def std(self, ddof=1):
+        """Return the per-wavelength standard deviation over replicates (NaN where there are too few values)."""
+        dof = self._count - ddof
+        variance = np.divide(self._m2, dof, out=np.full(self._m2.shape, np.nan), where=dof > 0)
+        return self._frame(np.sqrt(variance))
@@ -1,10 +1,46 @@
-import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
+from diagnostics import DiagnosticPlots
 
-def apply_smoothing(data, wavelengths, window_length=11, polyorder=2, output_dir="smoothing_plots"):
+def smooth_array(values, window_length=11, polyorder=2, time_window_length=None, time_polyorder=None,
+                 wavelengths=None, output_dir="smoothing_plots", diagnostics=None):
+    """
+    Savitzky-Golay smoothing of a whole wavelengths x time block in one call per axis.
+
+    Parameters:
+    - values: 2D array of absorbance data, wavelengths x time points.
+    - window_length: Window length for smoothing along the wavelength axis.
+    - polyorder: Polynomial order for smoothing along the wavelength axis.
+    - time_window_length: Optional window length for also smoothing along the time axis (2D denoising).
+    - time_polyorder: Polynomial order along the time axis, defaults to polyorder.
+    - wavelengths: Array of wavelength values, used for the plots.
+    - output_dir: Directory to save the plots.
+    - diagnostics: Optional DiagnosticPlots collector to queue the plots on (no plots if None).
+
+    Returns:
+    - smoothed: 2D float64 array of smoothed data.
+    """
+    smoothed = savgol_filter(np.asarray(values, dtype=np.float64), window_length, polyorder, axis=0)
+    if time_window_length:
+        if time_polyorder is None:
+            time_polyorder = polyorder
+        smoothed = savgol_filter(smoothed, time_window_length, time_polyorder, axis=1)
+
+    if diagnostics is not None:
+        for i in range(0, smoothed.shape[1], 100):
+            diagnostics.add(
+                f"{output_dir}/spectrum_{i + 1}.png",
+                wavelengths,
+                [(values[:, i], 'Original Spectrum'),
+                 (smoothed[:, i], 'Smoothed Spectrum')],
+                title=f'Smoothing - Spectrum {i + 1}'
+            )
+
+    return smoothed
+
+def apply_smoothing(data, wavelengths, window_length=11, polyorder=2, output_dir="smoothing_plots", diagnostics=None,
+                    time_window_length=None, time_polyorder=None):
     """
     Apply Savitzky-Golay smoothing to the data and save plots.
 
@@ -14,26 +50,23 @@ def apply_smoothing(data, wavelengths, window_length=11, polyorder=2, output_dir
     - window_length: Window length for smoothing.
     - polyorder: Polynomial order for smoothing.
     - output_dir: Directory to save the plots.
+    - diagnostics: Optional DiagnosticPlots collector; the plots are queued on it instead of
+      being rendered when smoothing is done.
+    - time_window_length: Optional window length for also smoothing along the time axis.
+    - time_polyorder: Polynomial order for the time axis smoothing, defaults to polyorder.
 
     Returns:
     - smoothed_data: DataFrame of smoothed data.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    smoothed_data = data.apply(lambda x: savgol_filter(x, window_length, polyorder), axis=0)
-
-    for i in range(data.shape[1]):
-        if i % 100 == 0:
-            plt.figure(figsize=(10, 6))
-            plt.plot(wavelengths, data.iloc[:, i], label='Original Spectrum')
-            plt.plot(wavelengths, smoothed_data.iloc[:, i], label='Smoothed Spectrum')
-            plt.xlabel('Wavelength')
-            plt.ylabel('Absorbance')
-            plt.title(f'Smoothing - Spectrum {i + 1}')
-            plt.legend()
-            plt.savefig(f"{output_dir}/spectrum_{i + 1}.png")
-            plt.close()
-            print(f"Plot saved: {output_dir}/spectrum_{i + 1}.png")
+    render_now = diagnostics is None
+    if render_now:
+        diagnostics = DiagnosticPlots()
+
+    smoothed = smooth_array(data.values, window_length, polyorder, time_window_length, time_polyorder,
+                            wavelengths=wavelengths, output_dir=output_dir, diagnostics=diagnostics)
+    smoothed_data = pd.DataFrame(smoothed, index=data.index, columns=data.columns, copy=False)
+
+    if render_now:
+        diagnostics.render()
 
     return smoothed_data
\ No newline at end of file
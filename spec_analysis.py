@@ -1,81 +1,65 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from lmfit.models import GaussianModel, LinearModel
+from dataset import SpectralDataset
+from peak_fitting import build_model, fit_time_series
+from fit_results import FitResultsWriter
 
 # Set the backend to 'Agg' for non-interactive plotting
 # plt.switch_backend('Agg')
 
-# Load the processed data from spec_main.py
-data = pd.read_csv('C:/Users/jake_/Desktop/HGD_nanospec/DTNB_5/hgd_R37S_DTNB_1_5_transmission.asc_pyspec/final_pyspec.csv', index_col=0)
-print(data)
+# Peak model: three Gaussians on a linear baseline
+PEAK_MODEL = [
+    {'model': 'gaussian', 'prefix': 'peak1_',
+     'params': {'amplitude': dict(value=0.2, min=0), 'center': dict(value=330), 'sigma': dict(value=1)}},
+    {'model': 'gaussian', 'prefix': 'peak2_',
+     'params': {'amplitude': dict(value=0.2, min=0), 'center': dict(value=412, min=410, max=420), 'sigma': dict(value=1)}},
+    {'model': 'linear', 'prefix': 'base_',
+     'params': {'slope': dict(value=0), 'intercept': dict(value=0)}},
+    {'model': 'gaussian', 'prefix': 'peak3_',
+     'params': {'amplitude': dict(value=0.2, min=0), 'center': dict(value=290, min=280, max=300), 'sigma': dict(value=1, min=0.1, max=1.5)}},
+]
 
-# Filter out wavelengths below 250
-data = data[data.index.astype(float) >= 280]
+# Number of worker processes for the fits (0 = all cores, 1 = sequential)
+jobs = 0
+# Fitting engine: 'batch' (all time points at once), 'analytic' (one at a time, analytic derivatives) or 'lmfit'
+engine = 'batch'
+# Fitted parameters per time point (.csv or .parquet); set report_path to also write the text fit reports
+results_path = 'fit_results.csv'
+report_path = None  # e.g. 'fit_report.log'
+# Progress is saved here; rerunning after a crash resumes from the completed time points
+checkpoint_path = 'fit_checkpoint.json'
 
-# Initialize variables to store the fitted parameters
-initial_params = None
+# The fits run in worker processes, so the script body must only run in the main process
+if __name__ == '__main__':
+    # Load the processed data from spec_main.py (.csv, .npz or .parquet)
+    dataset = SpectralDataset.read('C:/Users/jake_/Desktop/HGD_nanospec/DTNB_5/hgd_R37S_DTNB_1_5_transmission.asc_pyspec/final_pyspec.csv')
+    print(dataset)
 
-# Loop through each time point and perform the fitting
-for i, time_point in enumerate(data.columns):
-    y = data[time_point].values  # Absorbance values at the current time point
-    x = data.index.values.astype(float)  # Wavelength values
+    # Filter out wavelengths below 280 (a view of the wavelength window, no copy)
+    data = dataset.window(wavelength_range=(280, None)).to_frame()
 
-    # First Gaussian model
-    model1 = GaussianModel(prefix='peak1_')
-    params1 = model1.make_params(amplitude=dict(value=0.2, min=0),
-                                 center=dict(value=330),
-                                 sigma=dict(value=1))
-    # Second Gaussian model
-    model2 = GaussianModel(prefix='peak2_')
-    params2 = model2.make_params(amplitude=dict(value=0.2, min=0),
-                                 center=dict(value=412, min=410, max=420),
-                                 sigma=dict(value=1))
-    # Linear model for baseline
-    model3 = LinearModel(prefix='base_')
-    params3 = model3.make_params(slope=dict(value=0),
-                                 intercept=dict(value=0))
+    # Fit every time point; later time points are warm-started from the first fit
+    with FitResultsWriter(results_path, report_path=report_path) as writer:
+        results = fit_time_series(data, PEAK_MODEL, jobs=jobs, engine=engine, writer=writer,
+                                  checkpoint=checkpoint_path)
 
-    model4 = GaussianModel(prefix='peak3_')
-    params4 = model4.make_params(amplitude=dict(value=0.2, min=0),
-                                 center=dict(value=290, min=280, max=300),
-                                 sigma=dict(value=1, min=0.1, max=1.5))
+    # Plot the first spectrum for checking
+    time_point = data.columns[0]
+    x = data.index.values  # Wavelength values
+    y = data[time_point].values  # Absorbance values at the first time point
+    model, params = build_model(PEAK_MODEL)
+    for name, param in params.items():
+        if param.expr is None:
+            param.set(value=results.loc[time_point, name])
+    comps = model.eval_components(params=params, x=x)
 
-    # Combine the models and parameters
-    model = model1 + model2 + model3 + model4
-    params = params1 + params2 + params3 + params4
-
-    if initial_params is not None:
-        # Update parameters with tight constraints except for amplitude
-        for name, param in initial_params.items():
-            if 'amplitude' not in name:
-                params[name].set(value=param.value, min=param.value * 0.95, max=param.value * 1.05)
-            else:
-                params[name].set(value=param.value, min=0)
-
-    # Fit the model to the data
-    out = model.fit(y, params, x=x, method='leastsq', max_nfev=10000)
-    comps = out.eval_components()
-
-    if initial_params is None:
-        # Store the initial fitted parameters
-        initial_params = out.params
-
-    # Write the fit report to a log file
-    with open('fit_report.log', 'a') as f:
-        f.write(f'\nSpectra time_point: {time_point}\n')
-        f.write(out.fit_report(min_correl=0.3))
-
-    # Plot every 100th spectrum for checking
-    if i < 1:
-        plt.figure()
-        plt.scatter(x, y, label=f'data at {time_point}', s=5)
-        plt.plot(x, out.best_fit, label='best fit', color='red')
-        plt.plot(x, comps['peak1_'], label='peak1')
-        plt.plot(x, comps['peak2_'], label='peak2')
-        plt.plot(x, comps['peak3_'], label='peak3')
-        plt.plot(x, comps['base_'], label='baseline')
-        #plt.plot(x, out.init_fit, label='initial fit', linestyle='--')
-        plt.legend()
-        plt.title(f'Spectrum at {time_point}')
-        plt.show()
\ No newline at end of file
+    plt.figure()
+    plt.scatter(x, y, label=f'data at {time_point}', s=5)
+    plt.plot(x, model.eval(params=params, x=x), label='best fit', color='red')
+    plt.plot(x, comps['peak1_'], label='peak1')
+    plt.plot(x, comps['peak2_'], label='peak2')
+    plt.plot(x, comps['peak3_'], label='peak3')
+    plt.plot(x, comps['base_'], label='baseline')
+    plt.legend()
+    plt.title(f'Spectrum at {time_point}')
+    plt.show()
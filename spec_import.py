@@ -1,69 +1,320 @@
+import os
+import time
 import numpy as np
 import pandas as pd
 
-def load_absorbance_data(file_path, header_lines=0, footer_lines=0, time_point_interval=None):
+def _scan_numeric_block(lines, previous_line_empty=False):
+    """
+    Scan lines for the numeric block of a spectrum file, possibly continuing an earlier scan.
+
+    Applies the same stopping rules as the line-by-line reader: single empty lines are skipped,
+    two consecutive empty lines end the block, and so does a line whose first value is not numeric.
+    Only the first value of each line is checked here; the remaining values are converted in bulk.
+
+    Parameters:
+    - lines: List of raw lines (bytes).
+    - previous_line_empty: Whether the line before the first of lines was empty.
+
+    Returns:
+    - block: List of stripped, non-empty lines that belong to the numeric block.
+    - previous_line_empty: Whether the last line scanned was empty.
+    - ended: True if the block ended within lines.
+    """
+    block = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if previous_line_empty:
+                return block, previous_line_empty, True
+            previous_line_empty = True
+            continue
+
+        try:
+            float(line.split(None, 1)[0])
+        except ValueError:
+            return block, previous_line_empty, True
+        block.append(line)
+        previous_line_empty = False
+
+    return block, previous_line_empty, False
+
+def _locate_numeric_block(lines):
+    """
+    Find the lines making up the numeric block of a spectrum file (see _scan_numeric_block).
+
+    Parameters:
+    - lines: List of raw lines (bytes) following the header.
+
+    Returns:
+    - block: List of stripped, non-empty lines that make up the numeric block.
+    """
+    return _scan_numeric_block(lines)[0]
+
+def _parse_lines(lines):
+    """
+    Line-by-line conversion of the numeric block, used when the bulk conversion fails.
+
+    Stops at the first line that contains a non-numeric value, exactly like the original reader.
+    """
+    absorbance_data = []
+    for line in lines:
+        try:
+            absorbance_data.append(list(map(float, line.split())))
+        except ValueError:
+            break
+    return np.array(absorbance_data, dtype=np.float64)
+
+def _convert_block(block):
+    """
+    Convert the lines of a numeric block in a single call to numpy's C parser.
+
+    Parameters:
+    - block: List of stripped, non-empty lines (bytes), e.g. from _locate_numeric_block.
+
+    Returns:
+    - absorbance_data: 2D array with the wavelength in the first column and one column per time point.
+    """
+    if not block:
+        return np.empty((0, 0), dtype=np.float64)
+
+    try:
+        absorbance_data = np.loadtxt(block, dtype=np.float64, comments=None, ndmin=2)
+    except ValueError:
+        # A later value on one of the lines is not numeric (or the rows are ragged),
+        # fall back to the line-by-line rules to find where the data really stops
+        absorbance_data = _parse_lines(block)
+
+    return np.ascontiguousarray(absorbance_data)
+
+def parse_numeric_block(lines):
+    """
+    Convert the numeric block at the start of a list of lines into a contiguous float64 array.
+
+    Parameters:
+    - lines: List of raw lines (bytes) following the header.
+
+    Returns:
+    - absorbance_data: 2D array with the wavelength in the first column and one column per time point.
+    """
+    return _convert_block(_locate_numeric_block(lines))
+
+def read_absorbance_array(file_path, header_lines=0):
+    """
+    Read the numeric block of an .asc or .txt file into a contiguous float64 array.
+
+    The block is located once and then converted in a single call to numpy's C parser,
+    which is much faster than converting each value in Python for wide time-resolved files.
+
+    Parameters:
+    - file_path: Path to the .asc or .txt file.
+    - header_lines: Number of header lines to skip while reading the file.
+
+    Returns:
+    - absorbance_data: 2D array with the wavelength in the first column and one column per time point.
+    """
+    with open(file_path, 'rb') as file:
+        lines = file.read().splitlines()[header_lines:]
+
+    return parse_numeric_block(lines)
+
+def cache_path(file_path, header_lines=0):
+    """Return the path of the binary sidecar cache for a spectrum file."""
+    return f"{file_path}.h{header_lines}.pyspec.npy"
+
+def _write_cache(absorbance_data, file_path, header_lines):
+    """
+    Save the parsed array next to the source file as a .npy sidecar.
+
+    The sidecar is stamped with the source file's modification time, so it is only reused
+    while the source is unchanged. Failures (e.g. a read-only data directory) are not fatal.
+    """
+    sidecar = cache_path(file_path, header_lines)
+    tmp_path = f"{sidecar}.tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            np.save(file, absorbance_data)
+        source_stat = os.stat(file_path)
+        os.utime(tmp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(tmp_path, sidecar)
+    except OSError as e:
+        print(f"Warning: Could not write cache {sidecar}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_absorbance_array(file_path, header_lines=0, cache=False):
+    """
+    Load the numeric block of a spectrum file, optionally through a memory-mapped binary cache.
+
+    With cache=True the first call parses the text file and writes a .npy sidecar
+    (see cache_path); later calls memory-map the sidecar instead of parsing, so reloads are
+    near-instant and slicing rows or columns only reads those parts of the file from disk.
+
+    Parameters:
+    - file_path: Path to the .asc or .txt file.
+    - header_lines: Number of header lines to skip while reading the file.
+    - cache: Read from / write to the binary sidecar cache.
+
+    Returns:
+    - absorbance_data: 2D array (read-only memmap when loaded from the cache) with the
+      wavelength in the first column and one column per time point.
+    """
+    if not cache:
+        return read_absorbance_array(file_path, header_lines)
+
+    sidecar = cache_path(file_path, header_lines)
+    if os.path.exists(sidecar) and os.stat(sidecar).st_mtime_ns == os.stat(file_path).st_mtime_ns:
+        return np.load(sidecar, mmap_mode='r')
+
+    absorbance_data = read_absorbance_array(file_path, header_lines)
+    if absorbance_data.size:
+        _write_cache(absorbance_data, file_path, header_lines)
+    return absorbance_data
+
+def timed_load_absorbance_array(file_path, header_lines=0, cache=False):
+    """
+    Load the numeric block of a spectrum file and time how long it took.
+
+    Defined at module level so it can be sent to a process pool when ingesting many files.
+
+    Returns:
+    - absorbance_data: As returned by load_absorbance_array.
+    - parse_time: Wall time spent loading the file, in seconds.
+    """
+    start = time.perf_counter()
+    absorbance_data = load_absorbance_array(file_path, header_lines, cache=cache)
+    return absorbance_data, time.perf_counter() - start
+
+class IncrementalReader:
+    """
+    Reads a spectrum file that is still being written, returning only the rows completed since the last read.
+
+    The reader keeps the byte offset up to which the file has been consumed and the parse state of
+    the numeric block (header lines still to skip, whether the last line was empty, whether the block
+    has ended). Each read() seeks to the offset and parses only the complete lines written since,
+    with the same rules as read_absorbance_array; a partly written last line is left for the next
+    read. A last line without a trailing newline is only taken by read(final=True), once the file
+    is known to be complete (e.g. its size has stopped changing). Reading the whole file this way,
+    with a final read at the end, gives the same rows as read_absorbance_array.
+    """
+
+    def __init__(self, file_path, header_lines=0):
+        """
+        Parameters:
+        - file_path: Path to the .asc or .txt file.
+        - header_lines: Number of header lines to skip.
+        """
+        self.file_path = file_path
+        self.offset = 0
+        self.rows = 0
+        self.columns = None
+        self.finished = False
+        self._header_remaining = header_lines
+        self._previous_line_empty = False
+
+    def _tail_complete(self, tail):
+        """Whether an unterminated last line can be taken as a whole row (same column count as the rows so far)."""
+        fields = tail.split()
+        return not fields or self.columns is None or len(fields) == self.columns
+
+    def read(self, final=False):
+        """
+        Parse the rows completed since the last call.
+
+        Parameters:
+        - final: Also take a last line that has no trailing newline, if it has as many values as the
+          rows read so far. Only use this when no more data will be appended to that line.
+
+        Returns:
+        - absorbance_data: 2D array of the new rows, wavelength first and one column per time point
+          (empty if there are none, e.g. once the footer has been reached).
+        """
+        if self.finished:
+            return np.empty((0, 0), dtype=np.float64)
+
+        with open(self.file_path, 'rb') as file:
+            file.seek(self.offset)
+            chunk = file.read()
+        end = chunk.rfind(b'\n') + 1
+        if final and end < len(chunk) and self._tail_complete(chunk[end:]):
+            end = len(chunk)
+        if end == 0:
+            return np.empty((0, 0), dtype=np.float64)
+        self.offset += end
+
+        lines = chunk[:end].splitlines()
+        if self._header_remaining:
+            skipped = min(self._header_remaining, len(lines))
+            lines = lines[skipped:]
+            self._header_remaining -= skipped
+
+        block, self._previous_line_empty, self.finished = _scan_numeric_block(lines, self._previous_line_empty)
+        absorbance_data = _convert_block(block)
+        if len(absorbance_data) < len(block):
+            # The line-by-line fallback stopped at a line with a non-numeric value: the block ends there
+            self.finished = True
+        if absorbance_data.size:
+            self.columns = absorbance_data.shape[1]
+        self.rows += len(absorbance_data)
+        return absorbance_data
+
+def time_axis(num_time_points, time_point_interval=None):
+    """
+    Create the time axis of a spectrum file.
+
+    Parameters:
+    - num_time_points: Number of time points (columns after the wavelength column).
+    - time_point_interval: Time interval between each spectrum in seconds; 0.1 s if not given.
+
+    Returns:
+    - times: 1D float64 array of times in seconds, rounded to the nanosecond so that e.g. the
+      fourth point of a 0.1 s axis is 0.3 rather than 0.30000000000000004.
+    """
+    if not time_point_interval:
+        time_point_interval = 0.1
+    return np.round(np.arange(num_time_points) * time_point_interval, 9)
+
+def load_absorbance_data(file_path, header_lines=0, footer_lines=0, time_point_interval=None, cache=False,
+                         wavelength_range=None, time_slice=None):
     """
     Function to load absorbance data from an .asc or .txt file, handle header/footer,
     and return the data as a pandas DataFrame.
-    
+
     The first column in the file is assumed to be the wavelength, and the remaining columns are absorbance values.
-    
+
     Parameters:
     - file_path: Path to the .asc or .txt file.
     - header_lines: Number of header lines to skip while reading the file.
     - footer_lines: Number of footer lines to skip while reading the file.
     - time_point_interval: Time interval between each spectrum, in seconds (e.g., 0.1 for 100ms intervals).
-    
+    - cache: Use the memory-mapped binary sidecar cache (see load_absorbance_array).
+    - wavelength_range: Optional (min, max) tuple; only wavelengths in this range are loaded.
+    - time_slice: Optional slice of time point indices to load (e.g., slice(0, 200)).
+
     Returns:
-    - df: DataFrame with 'Wavelength' as the first column and time points as columns.
+    - df: DataFrame with 'Wavelength' as the first column and one column per time point, named by
+      its time in seconds (float).
     """
-    
-    # Initialize lists to store data
-    wavelengths = []
-    absorbance_data = []
 
-    # Open the file and read it line by line
-    with open(file_path, 'r') as file:
-        # Skip the header lines
-        for _ in range(header_lines):
-            next(file)
-        
-        # Read the data lines
-        previous_line_empty = False  # To detect two consecutive empty lines
-        for line in file:
-            # Remove any leading/trailing whitespace characters
-            line = line.strip()
-
-            # Stop reading if the line contains text (footer content) or two consecutive empty lines
-            if line == "":
-                if previous_line_empty:
-                    break  # Stop if two consecutive empty lines
-                previous_line_empty = True
-                continue
-            
-            # If the line contains non-numeric data (assumed to be footer), stop reading
-            try:
-                # Convert the line to a list of floats
-                values = list(map(float, line.split()))
-                absorbance_data.append(values)
-                wavelengths.append(values[0])  # Assuming the first value is the wavelength
-                previous_line_empty = False  # Reset if a valid line is found
-            except ValueError:
-                # If conversion to float fails, it's likely a footer or non-numeric line
-                break
-
-    # Convert absorbance data into a NumPy array
-    absorbance_data = np.array(absorbance_data)
-
-    # Create time labels (if not provided, default is 100ms intervals)
-    if time_point_interval:
-        num_time_points = absorbance_data.shape[1] - 1  # Subtract 1 for the wavelength column
-        time_points = [f'{i*time_point_interval:.1f}s' for i in range(num_time_points)]
-    else:
-        time_points = [f'{i*100}ms' for i in range(absorbance_data.shape[1] - 1)]
+    # Read the numeric block (stops at footer text or two consecutive empty lines)
+    absorbance_data = load_absorbance_array(file_path, header_lines, cache=cache)
+    if absorbance_data.size == 0:
+        return pd.DataFrame(columns=['Wavelength'])
+
+    # Time axis in seconds (if not provided, default is 100ms intervals)
+    time_points = time_axis(absorbance_data.shape[1] - 1, time_point_interval)  # Subtract 1 for the wavelength column
+
+    # Select the requested window before copying anything out of a memory-mapped cache
+    wavelengths = absorbance_data[:, 0]
+    values = absorbance_data[:, 1:]  # Skip the first column (wavelength)
+    if time_slice is not None:
+        values = values[:, time_slice]
+        time_points = time_points[time_slice]
+    if wavelength_range is not None:
+        rows = (wavelengths >= wavelength_range[0]) & (wavelengths <= wavelength_range[1])
+        wavelengths, values = wavelengths[rows], values[rows]
 
     # Create a DataFrame with the data
-    df = pd.DataFrame(absorbance_data[:, 1:], columns=time_points)  # Skip the first column (wavelength)
-    df.insert(0, 'Wavelength', wavelengths)  # Insert wavelengths as the first column
+    df = pd.DataFrame(np.array(values, dtype=np.float64), columns=time_points, copy=False)
+    df.insert(0, 'Wavelength', np.array(wavelengths))  # Insert wavelengths as the first column
 
     return df
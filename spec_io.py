@@ -0,0 +1,124 @@
+# spec_io.py
+import os
+import numpy as np
+import pandas as pd
+
+# Output formats supported by write_spectra/read_spectra (parquet needs pyarrow or fastparquet)
+FORMATS = ('csv', 'npz', 'parquet')
+
+def parse_time_labels(labels):
+    """
+    Convert time column labels such as '0.1s' or '100ms' (or plain numbers) to seconds.
+
+    Numeric labels, and the plain number headers written by write_spectra, are converted in one
+    step; only the string labels of older output files are parsed one by one.
+
+    Parameters:
+    - labels: Iterable of time point labels.
+
+    Returns:
+    - times: 1D float64 array of times in seconds.
+    """
+    labels = list(labels)
+    try:
+        return np.array(labels, dtype=np.float64)
+    except ValueError:
+        pass  # Unit-suffixed labels of files written before the numeric time axis
+
+    times = []
+    for label in labels:
+        label = str(label).strip()
+        if label.endswith('ms'):
+            times.append(float(label[:-2]) / 1000)
+        elif label.endswith('s'):
+            times.append(float(label[:-1]))
+        else:
+            times.append(float(label))
+    return np.array(times, dtype=np.float64)
+
+def time_window(times, start=None, end=None):
+    """
+    Column positions of the time points in [start, end], found by binary search.
+
+    Parameters:
+    - times: 1D array of times in seconds, in ascending order (the time axis of spec_main outputs).
+    - start: First time (seconds) to include; from the first time point if not given.
+    - end: Last time (seconds) to include; up to the last time point if not given.
+
+    Returns:
+    - window: slice of the columns, so data[:, window] or times[window] is a view.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+    last = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+    return slice(first, max(first, last))
+
+def spectra_path(output_dir, name, fmt='csv'):
+    """Return the path of an output file, e.g. spectra_path('out', 'final_pyspec', 'npz') -> 'out/final_pyspec.npz'."""
+    return os.path.join(output_dir, f"{name}.{fmt}")
+
+def write_spectra(file_path, values, wavelengths, times, fmt=None):
+    """
+    Write a wavelengths x time block of spectra.
+
+    csv keeps the existing text layout ('Wavelength' index, one column per time point) with the times
+    in seconds as plain numbers in the header. npz stores the block as float64 together with numeric
+    'wavelengths' and 'times' (seconds) arrays. parquet stores a float64 table with the wavelengths
+    as index and the numeric times in the metadata.
+
+    Parameters:
+    - file_path: Path of the output file.
+    - values: 2D array of absorbance data, wavelengths x time points.
+    - wavelengths: The wavelengths corresponding to the rows of values.
+    - times: Times in seconds of the columns of values (time labels such as '0.1s' are converted).
+    - fmt: One of FORMATS; inferred from the file extension if not given.
+    """
+    if fmt is None:
+        fmt = os.path.splitext(file_path)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of {FORMATS}")
+
+    values = np.asarray(values, dtype=np.float64)
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    times = parse_time_labels(times)
+
+    if fmt == 'npz':
+        np.savez(file_path, values=values, wavelengths=wavelengths, times=times)
+        return
+
+    # Header labels are the shortest repr of each time, so read_spectra recovers the exact floats
+    labels = [repr(float(t)) for t in times]
+    df = pd.DataFrame(values, index=pd.Index(wavelengths, name='Wavelength'), columns=labels, copy=False)
+    if fmt == 'csv':
+        df.to_csv(file_path)
+    else:
+        df.attrs['times'] = times.tolist()
+        df.to_parquet(file_path)
+
+def read_spectra(file_path):
+    """
+    Read spectra written by spec_main in any of the supported formats (.csv, .npz, .parquet).
+
+    Files written before the numeric time axis, with string time labels ('0.1s', '100ms') in the
+    header, are converted on load, so every format and version gives the same result.
+
+    Parameters:
+    - file_path: Path of the file to read.
+
+    Returns:
+    - data: DataFrame with float 'Wavelength' index and float time columns in seconds, backed by
+      one C-contiguous float64 block (so dataset.SpectralDataset.from_frame does not copy it).
+    """
+    fmt = os.path.splitext(file_path)[1].lstrip('.').lower()
+    if fmt == 'npz':
+        with np.load(file_path) as archive:
+            values, wavelengths, times = archive['values'], archive['wavelengths'], archive['times']
+    elif fmt == 'parquet':
+        df = pd.read_parquet(file_path)
+        values, wavelengths = np.ascontiguousarray(df.to_numpy(dtype=np.float64)), df.index.values.astype(float)
+        times = np.asarray(df.attrs['times'], dtype=np.float64) if 'times' in df.attrs else parse_time_labels(df.columns)
+    else:
+        df = pd.read_csv(file_path, index_col=0)
+        values, wavelengths, times = np.ascontiguousarray(df.to_numpy(dtype=np.float64)), df.index.values.astype(float), parse_time_labels(df.columns)
+
+    return pd.DataFrame(values, index=pd.Index(wavelengths, name='Wavelength'), columns=pd.Index(times), copy=False)
@@ -1,17 +1,16 @@
 import os
 import argparse
 import glob
-import pandas as pd
-from background_subtraction import subtract_background_and_save
-from spec_import import load_absorbance_data
-from baseline_correction import apply_baseline_correction
-from smoothing import apply_smoothing
-from wavelength_time import plot_wavelengths_over_time
-from time_spec import plot_spectra_over_time
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+# The processing stages (and numpy/pandas/scipy/matplotlib behind them) are imported inside main()
+# only when they are used, so -h and runs without optional stages start quickly
 
 # Argument parsing
 parser = argparse.ArgumentParser(description="Spectral data import and processing")
-parser.add_argument('-i', '--input', help="Path to the input files (use wildcard for multiple files)", type=str, required=True, nargs='+')
+parser.add_argument('-i', '--input', help="Path to the input files (use wildcard for multiple files)", type=str, nargs='+')
 parser.add_argument('-b', '--background', help="Path to the background spectrum file for subtraction", type=str)
 parser.add_argument('-H', '--header', help="Number of header lines in the file", type=int, default=0)
 parser.add_argument('-f', '--footer', help="Number of footer lines in the file", type=int, default=0)
@@ -19,98 +18,217 @@ parser.add_argument('-o', '--output', help="Name of the output directory", type=
 parser.add_argument('-t', '--time', help='Time for each spectra in S', type=float)
 parser.add_argument('--baseline', '-bl', help="Enable baseline correction", action='store_true')
 parser.add_argument('--smooth', '-sm', help="Enable Savitzky-Golay smoothing", action='store_true')
+parser.add_argument('--window', help="Savitzky-Golay window length along the wavelength axis", type=int, default=11)
+parser.add_argument('--polyorder', help="Savitzky-Golay polynomial order", type=int, default=2)
+parser.add_argument('--time-window', help="Also smooth along the time axis with this window length (2D denoising)", type=int)
 parser.add_argument('--wavelengths', '-w', help="List of wavelengths to plot over time", type=int, nargs='+')
 parser.add_argument('--Spectra_time', '-st', help="Plot every nth spectrum over time", type=int, default=10)
+parser.add_argument('--cache', '-c', help="Cache parsed input files as memory-mapped .npy sidecars for fast reloads", action='store_true')
+parser.add_argument('--jobs', '-j', help="Number of processes used to parse input files and render diagnostic plots (0 uses all cores)", type=int, default=1)
+parser.add_argument('--format', help="File format of the processed output (csv, npz or parquet)", choices=['csv', 'npz', 'parquet'], default='csv')
+parser.add_argument('--no-plots', help="Skip the diagnostic plots of the background, baseline and smoothing stages", action='store_true')
+parser.add_argument('--watch', help="Keep running and process new or growing input files in this directory as they are written", type=str)
+parser.add_argument('--pattern', help="Glob pattern of the input files in the --watch directory", type=str, default='*.asc')
+parser.add_argument('--interval', help="Seconds between checks of the --watch directory", type=float, default=2.0)
+
+def load_input_files(file_paths, header_lines, cache=False, jobs=1):
+    """
+    Parse the input files, in parallel when jobs > 1, and yield them in input order.
+
+    Parameters:
+    - file_paths: List of input file paths.
+    - header_lines: Number of header lines to skip in each file.
+    - cache: Use the binary sidecar cache (see spec_import.load_absorbance_array).
+    - jobs: Number of worker processes; 0 uses all cores, 1 parses in this process.
+
+    Yields:
+    - (file_path, absorbance_data, parse_time) for each file, in the order of file_paths.
+    """
+    from spec_import import timed_load_absorbance_array
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(file_paths))) as executor:
+            results = executor.map(timed_load_absorbance_array, file_paths, repeat(header_lines), repeat(cache))
+            for file_path, (absorbance_data, parse_time) in zip(file_paths, results):
+                yield file_path, absorbance_data, parse_time
+    else:
+        for file_path in file_paths:
+            absorbance_data, parse_time = timed_load_absorbance_array(file_path, header_lines, cache=cache)
+            yield file_path, absorbance_data, parse_time
+
+def process_average(averager, args, diagnostics):
+    """
+    Run the processing stages on the mean of the replicates and write their outputs.
+
+    Parameters:
+    - averager: ReplicateAverager holding the replicates read so far.
+    - args: Parsed command line arguments.
+    - diagnostics: DiagnosticPlots collector for the stages.
+
+    Returns:
+    - pipeline: The SpectralPipeline with the final processed data, or None without data.
+    """
+    from pipeline import SpectralPipeline
+    from spec_io import spectra_path, write_spectra
+
+    # Calculate the average across replicates (time columns) for each wavelength; the stages below
+    # then work in place on this one array and only build DataFrames when writing output
+    if averager.n_replicates:
+        pipeline = SpectralPipeline(averager.mean_values(), averager.wavelengths, averager.times, diagnostics)
+        print(f"Averaged {averager.n_replicates} replicates, mean data shape: {pipeline.values.shape}")
+        mean_output_path = spectra_path(args.output, "mean_pyspec", args.format)
+        pipeline.save(mean_output_path)
+        print(f"Mean data calculated and saved to {mean_output_path}.")
+        if averager.n_replicates > 1:
+            std_output_path = spectra_path(args.output, "std_pyspec", args.format)
+            write_spectra(std_output_path, averager.std().values, averager.wavelengths, averager.times)
+            print(f"Standard deviation across replicates saved to {std_output_path}.")
+    else:
+        pipeline = None
+        print("No data to process.")
+
+    # Background subtraction, if applicable
+    if args.background and pipeline is not None:
+        print("Performing background subtraction...")
+        from background_subtraction import load_background_spectrum
+        background_subtracted_path = spectra_path(args.output, "background_subtracted_pyspec", args.format)
+        pipeline.subtract_background(load_background_spectrum(args.background))
+        pipeline.save(background_subtracted_path)
+        print(f"Subtracted data saved to {background_subtracted_path}")
+
+    # Apply baseline correction if enabled
+    if args.baseline and pipeline is not None:
+        print("Applying baseline correction...")
+        baseline_corrected_path = spectra_path(args.output, "baseline_corrected_pyspec", args.format)
+        pipeline.baseline_correct()
+        pipeline.save(baseline_corrected_path)
+
+    # Apply smoothing if enabled
+    if args.smooth and pipeline is not None:
+        print("Applying smoothing...")
+        smoothed_path = spectra_path(args.output, "smoothed_pyspec", args.format)
+        pipeline.smooth(window_length=args.window, polyorder=args.polyorder, time_window_length=args.time_window)
+        pipeline.save(smoothed_path)
+
+    # Save the final processed data
+    if pipeline is not None:
+        final_output_path = spectra_path(args.output, "final_pyspec", args.format)
+        pipeline.save(final_output_path)
+        print(f"Processed data saved to {final_output_path}")
+    else:
+        print("No data saved due to empty DataFrame.")
+    return pipeline
+
+def plot_outputs(pipeline, args):
+    """Plot the requested wavelengths and spectra over time of the processed data."""
+    # Plot specified wavelengths over time if enabled
+    if args.wavelengths and pipeline is not None:
+        print("Plotting specified wavelengths over time...")
+        from wavelength_time import plot_wavelengths_over_time
+        plot_wavelengths_over_time(pipeline.to_dataset(), args.wavelengths)
+
+    # Plot spectra over time if enabled
+    if args.Spectra_time and pipeline is not None:
+        print("Plotting spectra over time...")
+        from time_spec import plot_spectra_over_time
+        plot_spectra_over_time(pipeline.to_dataset(), n=args.Spectra_time)
+
+def watch_directory(args):
+    """
+    Keep the pipeline resident and process input files as they are written (--watch).
+
+    New files and rows appended to growing files are folded into the running replicate average as
+    they appear (only rows not read before are parsed). After every change, the stages are rerun on
+    the updated mean and all outputs, including final_pyspec, are rewritten. The plots of the last
+    state are drawn when watching is stopped with Ctrl+C.
+    """
+    from spec_import import time_axis
+    from replicate_average import ReplicateAverager
+    from diagnostics import DiagnosticPlots
+    from watch import SpectraWatcher
+
+    watcher = SpectraWatcher(args.watch, args.pattern, args.header)
+    averager = ReplicateAverager()
+    pipeline = None
+    diagnostics = DiagnosticPlots(enabled=False)
+    print(f"Watching {os.path.join(args.watch, args.pattern)} every {args.interval:g} s (Ctrl+C to stop)...")
+    try:
+        while True:
+            updates = watcher.poll()
+            for file_path, absorbance_data, new_file in updates:
+                times = time_axis(absorbance_data.shape[1] - 1, args.time)
+                averager.add(absorbance_data[:, 0], absorbance_data[:, 1:], times, new_replicate=new_file)
+                print(f"{'New file' if new_file else 'Appended to'} {file_path}: {len(absorbance_data)} rows")
+
+            if updates:
+                start = time.perf_counter()
+                # Stage plots are collected for the latest data only and rendered on exit
+                diagnostics = DiagnosticPlots(enabled=not args.no_plots)
+                pipeline = process_average(averager, args, diagnostics)
+                print(f"Outputs refreshed in {time.perf_counter() - start:.2f} s")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+    plot_outputs(pipeline, args)
+    diagnostics.render(jobs=args.jobs)
+
+def main():
+    args = parser.parse_args()
+    if not args.input and not args.watch:
+        parser.error("one of -i/--input or --watch is required")
+
+    if args.time is None:
+        print("Warning: No time interval specified. Defaulting to 0.1s per spectrum.")
+        args.time = 0.1  # Default to 0.1 seconds
+
+    # Set the default output directory name based on the input argument
+    if args.output is None:
+        input_base_name = os.path.basename(os.path.normpath(args.watch)) if args.watch else os.path.basename(args.input[0])
+        args.output = f"{input_base_name}_pyspec"
+
+    # Create output directory if it doesn't exist
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    if args.watch:
+        watch_directory(args)
+        return
+
+    from spec_import import time_axis
+    from replicate_average import ReplicateAverager
+    from diagnostics import DiagnosticPlots
+
+    # Diagnostic plots are collected by the stages and rendered once the data has been saved
+    diagnostics = DiagnosticPlots(enabled=not args.no_plots)
+
+    # Expand wildcard paths into actual file paths (sorted, so the averaging order is reproducible)
+    file_paths = [file for input_path in args.input for file in sorted(glob.glob(input_path))]
+    if not file_paths:
+        print("No input files found.")
+    else:
+        print(f"Input file paths found: {file_paths}")
 
-args = parser.parse_args()
-
-if args.time is None:
-    print("Warning: No time interval specified. Defaulting to 0.1s per spectrum.")
-    args.time = 0.1  # Default to 0.1 seconds
-
-# Set the default output directory name based on the input argument
-if args.output is None:
-    input_base_name = os.path.basename(args.input[0])
-    args.output = f"{input_base_name}_pyspec"
+    # Fold each replicate into a running mean/variance per wavelength as it is read
+    averager = ReplicateAverager()
+    for file_path, absorbance_data, parse_time in load_input_files(file_paths, args.header, args.cache, args.jobs):
+        print(f"Loaded data from: {file_path} ({parse_time:.2f} s)")
 
-# Create output directory if it doesn't exist
-if not os.path.exists(args.output):
-    os.makedirs(args.output)
+        if absorbance_data.size == 0:
+            print(f"Warning: Empty data from {file_path}.")
+        else:
+            times = time_axis(absorbance_data.shape[1] - 1, args.time)
+            averager.add(absorbance_data[:, 0], absorbance_data[:, 1:], times)
+            del absorbance_data
 
-# Expand wildcard paths into actual file paths
-file_paths = [file for input_path in args.input for file in glob.glob(input_path)]
-if not file_paths:
-    print("No input files found.")
-else:
-    print(f"Input file paths found: {file_paths}")
+    pipeline = process_average(averager, args, diagnostics)
+    del averager
+    plot_outputs(pipeline, args)
 
-all_data = []
-for file_path in file_paths:
-    print(f"Loading data from: {file_path}")
-    df = load_absorbance_data(file_path, args.header, args.footer, time_point_interval=args.time)
+    diagnostics.render(jobs=args.jobs)
 
-    if df.empty:
-        print(f"Warning: Empty data from {file_path}.")
-    else:
-        all_data.append(df)
-
-# Check if any data was loaded
-if all_data:
-    combined_df = pd.concat(all_data, axis=0)
-    print(f"Combined DataFrame shape: {combined_df.shape}")
-else:
-    combined_df = pd.DataFrame()  # Empty DataFrame if no files loaded
-    print("No data to process.")
-
-# Calculate the average across replicates (time columns) by grouping by 'Wavelength'
-if not combined_df.empty:
-    mean_df = combined_df.groupby('Wavelength').mean()
-    mean_output_path = os.path.join(args.output, "mean_pyspec.csv")
-    mean_df.to_csv(mean_output_path)
-    print(f"Mean data calculated and saved to {mean_output_path}.")
-else:
-    mean_df = pd.DataFrame()
-    print("No mean data calculated due to empty combined DataFrame.")
-
-# Background subtraction, if applicable
-if args.background and not mean_df.empty:
-    print("Performing background subtraction...")
-    background_subtracted_path = os.path.join(args.output, "background_subtracted_pyspec.csv")
-    mean_df = subtract_background_and_save(mean_df, args.background, output_file=background_subtracted_path)
-    mean_df.to_csv(background_subtracted_path)
-
-# Extract wavelengths from the first column of mean_df
-if not mean_df.empty:
-    wavelengths = mean_df.index.values
-
-# Apply baseline correction if enabled
-if args.baseline and not mean_df.empty:
-    print("Applying baseline correction...")
-    baseline_corrected_path = os.path.join(args.output, "baseline_corrected_pyspec.csv")
-    mean_df = apply_baseline_correction(mean_df, wavelengths)
-    mean_df.to_csv(baseline_corrected_path)
-
-# Apply smoothing if enabled
-if args.smooth and not mean_df.empty:
-    print("Applying smoothing...")
-    smoothed_path = os.path.join(args.output, "smoothed_pyspec.csv")
-    mean_df = apply_smoothing(mean_df, wavelengths)
-    mean_df.to_csv(smoothed_path)
-
-# Plot specified wavelengths over time if enabled
-if args.wavelengths and not mean_df.empty:
-    print("Plotting specified wavelengths over time...")
-    plot_wavelengths_over_time(mean_df, wavelengths, args.wavelengths)
-
-# Plot spectra over time if enabled
-if args.Spectra_time and not mean_df.empty:
-    print("Plotting spectra over time...")
-    plot_spectra_over_time(mean_df, wavelengths, n=args.Spectra_time)
-
-# Save the final processed data
-if not mean_df.empty:
-    final_output_path = os.path.join(args.output, "final_pyspec.csv")
-    mean_df.to_csv(final_output_path)
-    print(f"Processed data saved to {final_output_path}")
-else:
-    print("No data saved due to empty DataFrame.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,37 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 from lmfit.models import ExponentialModel
+from dataset import SpectralDataset
+from kinetics import kinetics_map
+from fit_results import FitResultsWriter, model_result_row
 
 # Set the backend to 'Agg' for non-interactive plotting
 plt.switch_backend('Agg')
 
-# Load the data
-data = pd.read_csv('C:/Users/jake_/Desktop/HGD_nanospec/DTNB_5/hgd_R37S_DTNB_1_5_transmission.asc_pyspec/final_pyspec.csv', index_col=0)
-print(data)
-
-# Strip units and convert to float
-Time = data.columns.str.replace('s', '').astype(float)
-wavelengths = data.index.values.astype(float)
+# Load the data (.csv, .npz or .parquet; time columns are read as seconds)
+dataset = SpectralDataset.read('C:/Users/jake_/Desktop/HGD_nanospec/DTNB_5/hgd_R37S_DTNB_1_5_transmission.asc_pyspec/final_pyspec.csv')
+print(dataset)
 
 # Specify the wavelength and time point you want to plot
 selected_wavelength = 412
 cut_timepoint = 20
 
-# Function to find the closest wavelength
-def find_closest_wavelength(selected_wavelength, available_wavelengths):
-    return min(available_wavelengths, key=lambda x: abs(x - selected_wavelength))
+# Fitted parameters (.csv or .parquet); set report_path to also write the text fit report
+results_path = 'time_analysis_fit_results.csv'
+report_path = None  # e.g. 'time_analysis_fit_report.log'
 
-# Find the closest recorded wavelength
-closest_wavelength = find_closest_wavelength(selected_wavelength, wavelengths)
+# Rate constant vs wavelength map of all wavelengths (.csv); None to fit only the selected wavelength
+kinetics_map_path = 'kinetics_map.csv'
 
-# Check if the closest wavelength is in the data
-if closest_wavelength in wavelengths:
-    Absorbance = data.loc[closest_wavelength].values
+# Find the closest recorded wavelength (binary search on the sorted wavelength axis)
+closest_wavelength = dataset.index.nearest_wavelength(selected_wavelength)
 
-    # Cut the data at the specified time point
-    mask = Time <= cut_timepoint
-    Time = Time[mask]
-    Absorbance = Absorbance[mask]
+# Check if the closest wavelength is in the data
+if closest_wavelength in dataset.wavelengths:
+    # Cut the data at the specified time point (a view of the time window, found by binary search)
+    window = dataset.window(time_range=(None, cut_timepoint))
+    Time = window.times
+    Absorbance = window.traces(selected_wavelength)
 
     # Define weights to reduce the influence of noisy data points
     weights = np.ones_like(Absorbance)
@@ -47,10 +46,11 @@ if closest_wavelength in wavelengths:
     # Fit the model to the data with weights
     out = exp_mod.fit(Absorbance, params, x=Time, weights=weights)
 
-    # Write the fit report to a log file
-    with open('time_analysis_fit_report.log', 'a') as f:
-        f.write(f'\nSpectra wavelength: {closest_wavelength}\n')
-        f.write(out.fit_report(min_correl=0.3))
+    # Write the fitted parameters (and optionally the text fit report)
+    with FitResultsWriter(results_path, report_path=report_path) as writer:
+        writer.write([model_result_row(out, wavelength=closest_wavelength)])
+        if writer.report:
+            writer.write_report([f'\nSpectra wavelength: {closest_wavelength}\n' + out.fit_report(min_correl=0.3)])
 
     # Plot the data and the fit
     plt.scatter(Time, Absorbance, label='Data', s=5)
@@ -76,4 +76,17 @@ if closest_wavelength in wavelengths:
     plt.close()
 
 else:
-    print(f'Wavelength {closest_wavelength} not found in the data.')
\ No newline at end of file
+    print(f'Wavelength {closest_wavelength} not found in the data.')
+
+if kinetics_map_path is not None:
+    # Same time window as the single-wavelength fit (points before 2 s have zero weight there)
+    kinetics = kinetics_map(dataset, start_time=2, max_time=cut_timepoint)
+    kinetics.to_csv(kinetics_map_path)
+
+    fitted = kinetics[kinetics['success'] & (kinetics['r2'] > 0.5)]
+    plt.semilogy(fitted.index, fitted['rate'], '.', markersize=3)
+    plt.xlabel('Wavelength (nm)')
+    plt.ylabel('Rate constant (s$^{-1}$)')
+    plt.title('Exponential decay rate vs wavelength')
+    plt.savefig('kinetics_map.png')
+    plt.close()
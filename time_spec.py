@@ -1,23 +1,27 @@
 # time_spec.py
 import os
+import matplotlib
+matplotlib.use('Agg')  # Use Agg backend for non-interactive environments
 import matplotlib.pyplot as plt
+from dataset import as_dataset
 
-def plot_spectra_over_time(data, wavelengths, n, output_dir="spectra_time"):
+def plot_spectra_over_time(data, n, output_dir="spectra_time"):
     """
     Plot every nth spectrum on the same axis to show changes over time.
 
     Parameters:
-    - data: DataFrame of absorbance data.
-    - wavelengths: Array of wavelength values.
+    - data: SpectralDataset, or DataFrame of absorbance data with wavelengths as index and times in
+      seconds as columns.
     - n: Interval for plotting spectra.
     - output_dir: Directory to save the plot.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    dataset = as_dataset(data)
     plt.figure(figsize=(10, 6))
-    for i in range(0, data.shape[1], n):
-        plt.plot(wavelengths, data.iloc[:, i], label=f'Time {data.columns[i]}')
+    for i in range(0, len(dataset.times), n):
+        plt.plot(dataset.wavelengths, dataset.values[:, i], label=f'Time {dataset.times[i]:g} s')
 
     plt.xlabel('Wavelength')
     plt.ylabel('Absorbance')
@@ -0,0 +1,65 @@
+# watch.py
+import glob
+import os
+from spec_import import IncrementalReader
+
+class SpectraWatcher:
+    """
+    Polls a directory for new or growing spectrum files and returns only the rows not returned before.
+
+    Each poll() checks the size of every file matching the pattern. Every file has its own
+    spec_import.IncrementalReader, so a file that is new or larger than at the last poll is only
+    read from where the previous read stopped. A row that is still being written is picked up by a
+    later poll, once its line is complete, or once the file's size has not changed between two
+    polls if the file ends without a newline.
+    """
+
+    def __init__(self, directory, pattern='*.asc', header_lines=0):
+        """
+        Parameters:
+        - directory: Directory to watch.
+        - pattern: Glob pattern of the spectrum files in the directory.
+        - header_lines: Number of header lines in each file.
+        """
+        self.directory = directory
+        self.pattern = pattern
+        self.header_lines = header_lines
+        self._sizes = {}
+        self._readers = {}
+
+    def poll(self):
+        """
+        Read the new rows of all new or grown files.
+
+        Returns:
+        - updates: List of (file_path, absorbance_data, new_file) in file name order, absorbance_data
+          holding only the new rows (wavelength first, then one column per time point) and new_file
+          being True for the first rows of a file.
+        """
+        updates = []
+        for file_path in sorted(glob.glob(os.path.join(self.directory, self.pattern))):
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue  # Removed or renamed since the directory was listed
+            previous_size = self._sizes.get(file_path)
+            reader = self._readers.get(file_path)
+            final = False
+            if previous_size is not None and size <= previous_size:
+                if size < previous_size:
+                    print(f"Warning: {file_path} shrank; rows already read stay in the average.")
+                    self._sizes[file_path] = size
+                    continue
+                if reader is None or reader.finished or reader.offset >= size:
+                    continue
+                # Unchanged since the last poll with an unterminated last line: the file is complete
+                final = True
+
+            self._sizes[file_path] = size
+            if reader is None:
+                reader = self._readers[file_path] = IncrementalReader(file_path, self.header_lines)
+            new_file = reader.rows == 0
+            absorbance_data = reader.read(final=final)
+            if absorbance_data.size:
+                updates.append((file_path, absorbance_data, new_file))
+        return updates
@@ -0,0 +1,98 @@
+# wavelength_index.py
+import numpy as np
+
+class WavelengthIndex:
+    """
+    Sorted wavelength axis of a dataset with binary-search lookups.
+
+    Built once per dataset, it keeps the wavelengths in sorted order together with their row
+    positions, so nearest-wavelength and bracketing lookups for any number of targets cost one
+    np.searchsorted call (O(log n) per target) instead of a scan over all wavelengths. Row positions
+    always refer to the rows of the original data, which need not be sorted.
+    """
+
+    def __init__(self, wavelengths):
+        """
+        Parameters:
+        - wavelengths: 1D array of the dataset's wavelengths, one per row of its data.
+        """
+        self.wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        self.order = np.argsort(self.wavelengths, kind='stable')
+        self.sorted = self.wavelengths[self.order]
+
+    @classmethod
+    def from_frame(cls, df):
+        """Create the index of a DataFrame with wavelengths as index."""
+        return cls(df.index.values)
+
+    def __len__(self):
+        return len(self.wavelengths)
+
+    def _positions(self, targets):
+        """Positions in the sorted axis of the recorded wavelengths just below and above each target."""
+        targets = np.asarray(targets, dtype=np.float64)
+        upper = np.clip(np.searchsorted(self.sorted, targets), 1, len(self.sorted) - 1)
+        return targets, upper - 1, upper
+
+    def nearest(self, targets):
+        """
+        Row positions of the recorded wavelengths nearest to the targets.
+
+        Parameters:
+        - targets: Wavelength or array of wavelengths.
+
+        Returns:
+        - rows: Row position (int) for a single target, or an array of row positions. Ties go to
+          the shorter wavelength.
+        """
+        if len(self.sorted) == 1:
+            rows = np.zeros(np.shape(targets), dtype=np.intp)
+        else:
+            targets, lower, upper = self._positions(targets)
+            closer_upper = np.abs(self.sorted[upper] - targets) < np.abs(targets - self.sorted[lower])
+            rows = self.order[np.where(closer_upper, upper, lower)]
+        return int(rows) if np.ndim(rows) == 0 else rows
+
+    def nearest_wavelength(self, targets):
+        """Recorded wavelengths nearest to the targets (float for a single target, array otherwise)."""
+        wavelengths = self.wavelengths[self.nearest(targets)]
+        return float(wavelengths) if np.ndim(wavelengths) == 0 else wavelengths
+
+    def bracket(self, targets):
+        """
+        Recorded wavelengths on either side of each target, for linear interpolation.
+
+        Parameters:
+        - targets: Wavelength or array of wavelengths.
+
+        Returns:
+        - lower_rows, upper_rows: Row positions of the recorded wavelengths below and above each
+          target (the first or last two wavelengths for targets outside the recorded range).
+        - weights: Fraction of the way from the lower to the upper wavelength, clipped to [0, 1] so
+          targets outside the range take the value at the nearest end.
+        """
+        if len(self.sorted) == 1:
+            zeros = np.zeros(np.shape(targets), dtype=np.intp)
+            return zeros, zeros, np.zeros(np.shape(targets))
+        targets, lower, upper = self._positions(targets)
+        span = self.sorted[upper] - self.sorted[lower]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = np.where(span > 0, (targets - self.sorted[lower]) / span, 0.0)
+        return self.order[lower], self.order[upper], np.clip(weights, 0.0, 1.0)
+
+    def interpolate(self, values, targets):
+        """
+        Traces at arbitrary wavelengths, linearly interpolated between the recorded rows.
+
+        Parameters:
+        - values: Array with one row per recorded wavelength (e.g. wavelengths x time points), or a
+          DataFrame with the dataset's rows.
+        - targets: Array of wavelengths.
+
+        Returns:
+        - traces: Array with one row per target wavelength.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        lower, upper, weights = self.bracket(targets)
+        weights = np.expand_dims(weights, tuple(range(np.ndim(weights), np.ndim(weights) + values.ndim - 1)))
+        return values[lower] * (1 - weights) + values[upper] * weights
@@ -1,35 +1,35 @@
 # wavelength_time.py
 import os
-import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Use Agg backend for non-interactive environments
 import matplotlib.pyplot as plt
+from dataset import as_dataset
 
-def plot_wavelengths_over_time(data, wavelengths, specified_wavelengths, output_dir="wavelengths_time"):
+def plot_wavelengths_over_time(data, specified_wavelengths, output_dir="wavelengths_time"):
     """
     Plot specified wavelengths over time.
 
     Parameters:
-    - data: DataFrame of absorbance data.
-    - wavelengths: Array of wavelength values.
+    - data: SpectralDataset, or DataFrame of absorbance data with wavelengths as index and times in
+      seconds as columns.
     - specified_wavelengths: List of wavelengths to plot.
     - output_dir: Directory to save the plot.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    dataset = as_dataset(data)
     plt.figure(figsize=(10, 6))
-    for wavelength in specified_wavelengths:
-        # Find the nearest wavelength in the data
-        nearest_wavelength = wavelengths[np.abs(wavelengths - wavelength).argmin()]
-        plt.plot(data.columns, data.loc[nearest_wavelength], label=f'Wavelength {nearest_wavelength} nm')
+    # Find the nearest wavelengths in the data
+    rows = dataset.index.nearest(specified_wavelengths)
+    for row in rows:
+        plt.plot(dataset.times, dataset.values[row], label=f'Wavelength {dataset.wavelengths[row]} nm')
 
-    plt.xlabel('Time')
+    plt.xlabel('Time (s)')
     plt.ylabel('Absorbance')
     plt.title('Specified Wavelengths Over Time')
     plt.legend()
 
-    # Set x-ticks to show every 100th label
-    plt.xticks(ticks=np.arange(0, len(data.columns), 100), labels=data.columns[::100])
-
     plot_filename = f"{output_dir}/wavelengths_time.png"
     plt.savefig(plot_filename)
     plt.close()